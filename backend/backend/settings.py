@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,6 +46,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'ecomerce.metrics.MetricsMiddleware',
+    'ecomerce.budgets.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -52,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'ecomerce.replicas.PinWritersToPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -77,13 +81,126 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DB_PROFILE picks the database setup:
+#   sqlite      - the development file database (default)
+#   sqlite-wal  - SQLite tuned for a single-node deployment: WAL journal so
+#                 reads never wait for the writer, persistent connections
+#   postgres    - PostgreSQL from the POSTGRES_* variables, with persistent
+#                 connections or, when DB_POOL_MAX_SIZE is set, a psycopg pool
+DB_PROFILE = os.environ.get('DB_PROFILE', 'sqlite')
+
+SQLITE_DATABASE = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    'OPTIONS': {
+        # Take the write lock at BEGIN and wait for it, so concurrent
+        # checkouts queue up instead of failing with "database is locked"
+        'transaction_mode': 'IMMEDIATE',
+        'timeout': 20,
+    },
+    'TEST': {
+        # In-memory test databases use shared-cache mode, which ignores
+        # the busy timeout; the concurrency tests need a real file
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    },
 }
 
+if DB_PROFILE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('POSTGRES_DB', 'hostel_snack'),
+            'USER': os.environ.get('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+    }
+    pool_size = int(os.environ.get('DB_POOL_MAX_SIZE', 0))
+    if pool_size:
+        # Pooled connections are returned after every request, which Django
+        # only allows without persistent connections (needs psycopg[pool])
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': min(2, pool_size),
+            'max_size': pool_size,
+            'timeout': 10,
+        }
+elif DB_PROFILE == 'sqlite-wal':
+    DATABASES = {
+        'default': {
+            **SQLITE_DATABASE,
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                **SQLITE_DATABASE['OPTIONS'],
+                # WAL is safe with synchronous=NORMAL: a power cut can only
+                # lose the last commits, never corrupt the file
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    'PRAGMA cache_size=-32000;'
+                    'PRAGMA temp_store=MEMORY;'
+                    'PRAGMA mmap_size=134217728;'
+                ),
+            },
+        }
+    }
+else:
+    DATABASES = {'default': SQLITE_DATABASE}
+
+# Optional read replica for catalog reads (see ecomerce/replicas.py). For a
+# local setup, point SQLITE_REPLICA_PATH at a copy of the database file
+if DB_PROFILE == 'postgres' and os.environ.get('POSTGRES_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['POSTGRES_REPLICA_HOST'],
+        'PORT': os.environ.get('POSTGRES_REPLICA_PORT', DATABASES['default']['PORT']),
+    }
+elif DB_PROFILE != 'postgres' and os.environ.get('SQLITE_REPLICA_PATH'):
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH']}
+
+if 'replica' in DATABASES:
+    # Tests run both aliases against the one test database
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+READ_REPLICA = 'replica' if 'replica' in DATABASES else None
+DATABASE_ROUTERS = ['ecomerce.replicas.ReplicaRouter']
+
+# Seconds a user's catalog reads stay on the primary after they write
+REPLICA_PIN_SECONDS = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The in-memory default is private to each server process. With several
+# workers, set REDIS_URL (needs the redis package) so they share one cache;
+# token caching only uses a cache that is shared
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'hostel-snack',
+        }
+    }
+
+# Seconds a public catalog response is cached for; 0 disables the cache
+CATALOG_CACHE_TTL = 300
+
+# Seconds the site-wide dashboard counts are cached for
+DASHBOARD_STATS_TTL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,12 +256,38 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+    'if-none-match',
+    'if-modified-since',
 ]
+CORS_EXPOSE_HEADERS = ['idempotent-replayed', 'etag']
+
+# How long an Idempotency-Key's first response is replayed for (seconds)
+IDEMPOTENCY_KEY_TTL = 60 * 60 * 24
+
+# How long stock reserved by POST /api/checkout/reserve/ is held (seconds)
+STOCK_RESERVATION_TTL = 60 * 10
+
+# Resolved API tokens are cached in the default cache when it is shared;
+# logout and token rotation invalidate it. A per-process layer on top is
+# off: other processes would keep a revoked token for its whole TTL
+TOKEN_AUTH_CACHE_TTL = 60
+TOKEN_AUTH_LOCAL_TTL = 0
+TOKEN_AUTH_LOCAL_SIZE = 1024
+
+# Per-view latency, query and response size metrics, served at /api/metrics/.
+# Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged; None disables that
+METRICS_ENABLED = True
+SLOW_REQUEST_THRESHOLD_MS = None
+
+# What to do when a view runs more queries than its query_budget: 'raise',
+# 'log' or None to skip the check (the test suite raises)
+QUERY_BUDGET_MODE = 'log' if DEBUG else None
 
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'ecomerce.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, Wishlist
+from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, StockReservation, Wishlist
 
 
 @admin.register(Category)
@@ -14,6 +14,7 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['category', 'is_active', 'created_at']
     search_fields = ['name', 'description']
     list_editable = ['price', 'stock', 'is_active']
+    readonly_fields = ['rating_sum', 'rating_count']
 
 
 @admin.register(Profile)
@@ -52,3 +53,10 @@ class ReviewAdmin(admin.ModelAdmin):
 class WishlistAdmin(admin.ModelAdmin):
     list_display = ['user', 'product', 'created_at']
     list_filter = ['created_at']
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'product', 'quantity', 'expires_at']
+    list_filter = ['expires_at']
+    search_fields = ['product__name', 'user__username']
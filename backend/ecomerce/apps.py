@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class EcomerceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecomerce'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import signals  # noqa: F401
+        from .metrics import install_query_observer
+
+        connection_created.connect(install_query_observer)
@@ -0,0 +1,136 @@
+"""Async versions of the read-heavy catalog and dashboard endpoints.
+
+They answer with the same JSON as their DRF counterparts but query through
+Django's async ORM, so under an ASGI server (``uvicorn backend.asgi:application``)
+a worker is not tied up while a request waits on the database or a slow client.
+Catalog reads honour the read replica like the sync views do.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .authentication import CachedTokenAuthentication
+from .budgets import query_budget
+from .models import Category, Product
+from .replicas import is_pinned, replica_reads
+from .search import search_products
+from .serializers import CategorySerializer, ProductSerializer
+from .stats import acatalog_counts, auser_counts
+
+
+async def authenticate(request):
+    """Resolve an ``Authorization: Token <key>`` header to a user, or None.
+
+    An unknown token or inactive user raises AuthenticationFailed, as it does
+    for the DRF views; ``unauthorized`` turns it into their 401 response.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if len(header) != 2 or header[0] != 'Token':
+        return None
+    user, token = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(header[1])
+    return user
+
+
+def unauthorized(exc):
+    response = JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+    response['WWW-Authenticate'] = CachedTokenAuthentication().authenticate_header(None)
+    return response
+
+
+async def paginate(request, queryset, serializer_class):
+    """PageNumberPagination's response, built with async queries"""
+    page_size = api_settings.PAGE_SIZE
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        page = 0
+    count = await queryset.acount()
+    last_page = max((count + page_size - 1) // page_size, 1)
+    if not 1 <= page <= last_page:
+        raise Http404('Invalid page.')
+
+    offset = (page - 1) * page_size
+    results = [obj async for obj in queryset[offset:offset + page_size]]
+    url = request.build_absolute_uri()
+    previous = None
+    if page > 1:
+        previous = remove_query_param(url, 'page') if page == 2 else replace_query_param(url, 'page', page - 1)
+    return {
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page < last_page else None,
+        'previous': previous,
+        'results': serializer_class(results, many=True, context={'request': request}).data,
+    }
+
+
+def catalog_view(view):
+    """Return 404s as DRF does and read from the replica unless the user is pinned"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+        pinned = False
+        if getattr(settings, 'READ_REPLICA', None):
+            try:
+                user = await authenticate(request)
+            except AuthenticationFailed as exc:
+                return unauthorized(exc)
+            pinned = user is not None and await sync_to_async(is_pinned)(user)
+        try:
+            if pinned:
+                data = await view(request, *args, **kwargs)
+            else:
+                with replica_reads():
+                    data = await view(request, *args, **kwargs)
+        except Http404 as exc:
+            return JsonResponse({'detail': str(exc)}, status=404)
+        return JsonResponse(data)
+    return wrapper
+
+
+@query_budget(2)
+@catalog_view
+async def category_list(request):
+    return await paginate(request, Category.objects.all(), CategorySerializer)
+
+
+@query_budget(2)
+@catalog_view
+async def product_list(request):
+    queryset = Product.objects.filter(is_active=True).select_related('category')
+    category = request.GET.get('category')
+    search = request.GET.get('search')
+    if category is not None:
+        queryset = queryset.filter(category_id=category)
+    queryset = queryset.order_by('-created_at', '-id')
+    if search is not None:
+        queryset = search_products(queryset, search)
+    return await paginate(request, queryset, ProductSerializer)
+
+
+@query_budget(1)
+@catalog_view
+async def product_detail(request, pk):
+    try:
+        product = await Product.objects.filter(is_active=True).select_related('category').aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404('No Product matches the given query.')
+    return ProductSerializer(product, context={'request': request}).data
+
+
+@query_budget(4)
+async def dashboard_stats(request):
+    """Get basic stats for dashboard"""
+    try:
+        user = await authenticate(request)
+    except AuthenticationFailed as exc:
+        return unauthorized(exc)
+    stats = dict(await acatalog_counts())
+    if user is not None:
+        stats.update(await auser_counts(user))
+    return JsonResponse(stats)
@@ -0,0 +1,91 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import cache_is_shared
+
+CACHE_KEY = 'auth-token:{}'
+
+
+def token_cache_key(key):
+    return CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+
+class LocalTokenCache:
+    """Small thread-safe LRU of token key -> (user, expiry) for this process"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user, ttl, max_size):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_tokens = LocalTokenCache()
+
+
+def invalidate_token(key):
+    """Forget a token in this process and in the shared cache"""
+    local_tokens.delete(key)
+    cache.delete(token_cache_key(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that remembers resolved tokens.
+
+    Tokens are cached only when the default cache is shared between
+    processes, so deleting a token or saving its user (see signals.py)
+    revokes it everywhere at once. Lookups then go to the default cache
+    (TOKEN_AUTH_CACHE_TTL seconds) before the database. An in-process LRU in
+    front of it is opt-in with TOKEN_AUTH_LOCAL_TTL: nothing tells other
+    processes to drop their entries, so they accept a revoked token for up
+    to that many seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        if not cache_is_shared():
+            user, token = super().authenticate_credentials(key)
+            return user, token
+
+        local_ttl = getattr(settings, 'TOKEN_AUTH_LOCAL_TTL', 0)
+        user = local_tokens.get(key) if local_ttl else None
+        if user is None:
+            user = cache.get(token_cache_key(key))
+            if user is None:
+                user, token = super().authenticate_credentials(key)
+                cache.set(token_cache_key(key), user, getattr(settings, 'TOKEN_AUTH_CACHE_TTL', 60))
+            if local_ttl:
+                local_tokens.set(key, user, local_ttl, getattr(settings, 'TOKEN_AUTH_LOCAL_SIZE', 1024))
+        # Each request gets its own instance, so cached relations never leak
+        return copy.copy(user), self.get_model()(key=key, user_id=user.pk)
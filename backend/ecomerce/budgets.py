@@ -0,0 +1,119 @@
+import logging
+import os
+import traceback
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import observing_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run, whatever the size of the data.
+
+    Class-based views can set a ``query_budget`` attribute instead. Put the
+    decorator above ``@api_view`` so it lands on the view Django calls.
+    """
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def budget_for(view_func):
+    budget = getattr(view_func, 'query_budget', None)
+    if budget is None:
+        budget = getattr(getattr(view_func, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that keeps each query's SQL.
+
+    The call stack, which is slow to extract, is only kept for the first
+    query over the request's budget. The budget is looked up once URL
+    resolution has set ``request.resolver_match``.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.queries = []
+        self.budget = None
+        self.over_budget_stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        if self.budget is None and self.request.resolver_match is not None:
+            self.budget = budget_for(self.request.resolver_match.func)
+        if self.budget is not None and len(self.queries) == self.budget + 1:
+            self.over_budget_stack = traceback.extract_stack()[:-1]
+        return execute(sql, params, many, context)
+
+
+def triggering_frames(stack, limit=15):
+    """The innermost frames outside the ORM and the execute wrappers"""
+    frames = [
+        frame for frame in stack
+        if f'django{os.sep}db{os.sep}' not in frame.filename and not (frame.line or '').startswith('return execute(')
+    ]
+    return traceback.StackSummary.from_list(frames[-limit:])
+
+
+class QueryBudgetMiddleware:
+    """Check every request against its view's query budget.
+
+    QUERY_BUDGET_MODE is 'raise' (tests), 'log' or None, which removes the
+    middleware. The report lists every query and the stack of the first one
+    over budget.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_MODE', None):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder(request)
+        with observing_queries(recorder):
+            response = self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(request)
+        with observing_queries(recorder):
+            response = await self.get_response(request)
+        self.check(request, recorder)
+        return response
+
+    def check(self, request, recorder):
+        match = request.resolver_match
+        budget = budget_for(match.func) if match else None
+        if budget is not None and len(recorder.queries) > budget:
+            self.report(request, match, budget, recorder)
+
+    def report(self, request, match, budget, recorder):
+        queries = recorder.queries
+        lines = [f'{request.method} {request.path} ({match.url_name}) ran {len(queries)} queries, budget is {budget}:']
+        lines += [f'  {i}. {sql}' for i, sql in enumerate(queries, 1)]
+        if recorder.over_budget_stack is not None:
+            lines.append(f'Query {budget + 1} was run from:')
+            lines.append(''.join(triggering_frames(recorder.over_budget_stack).format()).rstrip())
+        message = '\n'.join(lines)
+        if settings.QUERY_BUDGET_MODE == 'raise':
+            raise QueryBudgetExceeded(message)
+        logger.error(message)
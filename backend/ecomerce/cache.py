@@ -0,0 +1,129 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .replicas import reading_from_replica
+
+VERSION_KEY = 'catalog-version:{}'
+# Set for REPLICA_PIN_SECONDS after a group changes, while the replica may lag
+RECENT_CHANGE_KEY = 'catalog-changed:{}'
+# Validators stored with each entry so cache hits can still answer with a 304
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def cache_is_shared():
+    """Whether every server process sees the same default cache"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def record(view_name, outcome):
+    with _stats_lock:
+        _stats[(view_name, outcome)] += 1
+
+
+def cache_stats():
+    """Per-view hit/miss counters for this process"""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    stats = {}
+    for (view_name, outcome), count in sorted(snapshot.items()):
+        stats.setdefault(view_name, {'hits': 0, 'misses': 0})[outcome] = count
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def invalidate_catalog(*groups):
+    """Bump the version of each group so every response built from it is stale"""
+    for group in groups:
+        key = VERSION_KEY.format(group)
+        # Seed the counter first; incr fails on a missing key
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+    if getattr(settings, 'READ_REPLICA', None):
+        cache.set_many(
+            {RECENT_CHANGE_KEY.format(group): True for group in groups},
+            getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+        )
+
+
+def replica_may_lag(groups):
+    """Whether a replica read may predate the latest change to these groups"""
+    if not reading_from_replica():
+        return False
+    return bool(cache.get_many([RECENT_CHANGE_KEY.format(group) for group in groups]))
+
+
+def response_cache_key(request, view_name, groups):
+    versions = cache.get_many([VERSION_KEY.format(group) for group in groups])
+    version = '.'.join(str(versions.get(VERSION_KEY.format(group), 0)) for group in groups)
+    query = '&'.join(
+        f'{name}={value}'
+        for name in sorted(request.query_params)
+        for value in sorted(request.query_params.getlist(name))
+    )
+    raw = f'{request.get_host()}{request.path}?{query}|{request.accepted_renderer.format}'
+    return f'catalog:{view_name}:{version}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+class CachedResponseMixin:
+    """Serve GET responses of public read-only views from the default cache.
+
+    Entries are keyed by path and normalized query params and carry the
+    current version of every group in ``cache_dependencies``; the model
+    signals bump those versions, so a change is visible on the next request.
+    A miss read from the replica shortly after a change is served but not
+    stored, since the replica may not have that change yet. List it before
+    ConditionalGetMixin so hits are answered from the stored
+    validators without touching the database.
+    """
+    cache_dependencies = ()
+
+    def get(self, request, *args, **kwargs):
+        ttl = getattr(settings, 'CATALOG_CACHE_TTL', 300)
+        if not ttl:
+            return super().get(request, *args, **kwargs)
+
+        view_name = type(self).__name__
+        key = response_cache_key(request, view_name, self.cache_dependencies)
+        cached = cache.get(key)
+        if cached is not None:
+            record(view_name, 'hits')
+            headers = cached['headers']
+            response = get_conditional_response(
+                request,
+                etag=headers.get('ETag'),
+                last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+            )
+            if response is None:
+                response = Response(cached['data'], status=cached['status'], headers=headers)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record(view_name, 'misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == 200 and not replica_may_lag(self.cache_dependencies):
+            cache.set(key, {
+                'data': response.data,
+                'status': response.status_code,
+                'headers': {name: response[name] for name in VALIDATOR_HEADERS if name in response},
+            }, ttl)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,99 @@
+import hashlib
+from datetime import datetime
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def related_values(instance, path):
+    """Values of a ``__`` path such as ``items__product__updated_at`` on a loaded instance.
+
+    Only relations the view's queryset already loaded (select_related or
+    prefetch_related) are followed, so no queries are run; anything else
+    isn't in the response either.
+    """
+    *relations, field = path.split('__')
+    objects = [instance]
+    for name in relations:
+        following = []
+        for obj in objects:
+            prefetched = getattr(obj, '_prefetched_objects_cache', {})
+            if name in prefetched:
+                following.extend(prefetched[name])
+            elif obj._state.fields_cache.get(name) is not None:
+                following.append(obj._state.fields_cache[name])
+        objects = following
+    return [getattr(obj, field) for obj in objects]
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified handling for list and detail GETs.
+
+    The validators are built from the rows already fetched for the response:
+    each row's id and every value of ``etag_fields`` (related timestamps such
+    as ``category__updated_at`` cover nested objects), plus the pagination
+    envelope. No query beyond the page itself is run, and when the client's
+    validator still matches, a 304 is returned before anything is serialized.
+
+    Lists only send an ETag. Their newest timestamp does not move when a row
+    is deleted or leaves the page, so ``If-Modified-Since`` could answer 304
+    for a list that has changed; detail views also send ``Last-Modified``.
+    """
+    etag_fields = ('updated_at',)
+
+    def get_validators(self, request, rows, envelope=None):
+        values, timestamps = [], []
+        for row in rows:
+            values.append(row.pk)
+            for field in self.etag_fields:
+                found = related_values(row, field)
+                values.append(found)
+                timestamps += [value for value in found if isinstance(value, datetime)]
+
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        raw = '|'.join([
+            type(self).__name__,
+            request.get_full_path(),
+            request.accepted_renderer.format,
+            repr(envelope),
+            repr(values),
+        ])
+        return f'"{hashlib.md5(raw.encode()).hexdigest()}"', last_modified
+
+    def conditional_response(self, request, rows, build, envelope=None, dated=False):
+        etag, last_modified = self.get_validators(request, rows, envelope)
+        if not dated:
+            last_modified = None
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = build()
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            rows = list(queryset)
+            return self.conditional_response(
+                request, rows, lambda: Response(self.get_serializer(rows, many=True).data)
+            )
+
+        # Everything but the results: count and links change the body too
+        envelope = dict(self.get_paginated_response([]).data)
+        return self.conditional_response(
+            request, page,
+            lambda: self.get_paginated_response(self.get_serializer(page, many=True).data),
+            envelope,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        return self.conditional_response(
+            request, [instance], lambda: Response(self.get_serializer(instance).data), dated=True
+        )
@@ -0,0 +1,87 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.path}:{body}'.encode()).hexdigest()
+
+
+def expired_before():
+    """Keys created before this moment are no longer replayed"""
+    return timezone.now() - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 60 * 60 * 24))
+
+
+def replay(stored, fingerprint):
+    if stored is None:
+        return Response({'error': 'Idempotency-Key expired, please retry'},
+                        status=status.HTTP_409_CONFLICT)
+    if stored.fingerprint != fingerprint:
+        return Response({'error': 'Idempotency-Key was already used for a different request'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(stored.response, status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view_func):
+    """Replay the first successful response for a repeated Idempotency-Key.
+
+    Keys are scoped to the authenticated user and stored in the database for
+    IDEMPOTENCY_KEY_TTL seconds. The key row is inserted in one transaction
+    with everything the view writes: a concurrent retry, in any process,
+    waits on the unique (user, key) index and then replays the stored
+    response, and a failed request leaves neither the key nor its writes
+    behind. Requests without the header run as usual; with it they cost
+    three more queries (the key's INSERT and UPDATE, and a savepoint or
+    transaction around the view), which the view's query budget includes.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_func(request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': 'Idempotency-Key must be at most 255 characters'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        claimed = False
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(user=request.user, key=key, fingerprint=fingerprint)
+                claimed = True
+                response = view_func(request, *args, **kwargs)
+                # Only successful results are remembered; failures may be retried
+                if not status.is_success(response.status_code):
+                    transaction.set_rollback(True)
+                    return response
+                record.status_code = response.status_code
+                record.response = response.data
+                record.save(update_fields=['status_code', 'response'])
+                return response
+        except IntegrityError:
+            if claimed:
+                raise
+
+        # The key was used before, or a concurrent request with it committed
+        # while this one waited on the index
+        stored = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if stored is not None and stored.created_at <= expired_before():
+            stored.delete()
+            return wrapper(request, *args, **kwargs)
+        return replay(stored, fingerprint)
+
+    return wrapper
@@ -0,0 +1,230 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ecomerce import urls
+from ecomerce.authentication import local_tokens
+from ecomerce.metrics import QueryTimer
+from ecomerce.models import Product
+from ecomerce.synthetic import CATEGORIES, SyntheticData
+
+PREFIX = 'apibench'
+
+
+class Command(BaseCommand):
+    help = 'Drive every API route and report latency percentiles, throughput and query counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1,
+                            help='Dataset size: 200 products, 50 users, 100 orders and 500 reviews per step')
+        parser.add_argument('--iterations', type=int, default=20, help='Shopper journeys to run')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--no-cache', action='store_true', help='Bypass the catalog response cache')
+        parser.add_argument('--output', help='Where to write the JSON results (default: benchmark-results/)')
+        parser.add_argument('--compare', help='Earlier JSON results to compare this run against')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        self.seed = options['seed']
+        self.rng = random.Random(self.seed)
+        self.samples = defaultdict(list)
+        cache.clear()
+        local_tokens.clear()
+
+        # Production-like: no query logging or budget checks
+        overrides = {'DEBUG': False, 'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'localhost'], 'QUERY_BUDGET_MODE': None}
+        if options['no_cache']:
+            overrides['CATALOG_CACHE_TTL'] = 0
+        # The seeded catalog, users and orders only live in this transaction,
+        # which is rolled back once every route has been timed
+        with override_settings(**overrides), transaction.atomic():
+            start = time.perf_counter()
+            self.seed_data(options['scale'])
+            self.stdout.write(f'Seeded scale {options["scale"]} in {time.perf_counter() - start:.1f}s')
+            start = time.perf_counter()
+            for i in range(options['iterations']):
+                self.journey(i)
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+        cache.clear()
+        local_tokens.clear()
+
+        missing = {p.name for p in urls.urlpatterns} - {key.split()[1].split('?')[0] for key in self.samples}
+        if missing:
+            raise CommandError(f'Routes not exercised: {", ".join(sorted(missing))}')
+
+        results = self.results(options, elapsed)
+        self.report(results)
+        path = Path(options['output'] or Path(settings.BASE_DIR) / 'benchmark-results' /
+                    f"api-{results['meta']['started'].replace(':', '')}-{results['meta']['commit'][:8]}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(results, indent=2))
+        self.stdout.write(self.style.SUCCESS(f'Results written to {path}'))
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text()), results)
+
+    def seed_data(self, scale):
+        generator = SyntheticData(seed=self.seed)
+        generator.generate(users=50 * scale, products=200 * scale, orders=100 * scale, reviews=500 * scale)
+        # Synthetic rows skip the signals that maintain these
+        call_command('rebuild_ratings', stdout=StringIO())
+        call_command('rebuild_search_index', stdout=StringIO())
+        # Journeys shop from active products, which must never run out
+        Product.objects.update(stock=10 ** 6)
+        self.products = [product for product in generator.products if product.is_active]
+
+        self.admin = User.objects.create_user(username=f'{PREFIX}-admin', is_staff=True)
+        self.admin_client = self.client_for(Token.objects.create(user=self.admin).key)
+
+    def client_for(self, key=None):
+        client = APIClient(SERVER_NAME='localhost')
+        if key:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+        return client
+
+    def call(self, client, method, name, args=(), data=None, label='', expected=200):
+        """Time one request and count its queries under '<METHOD> <name><label>'"""
+        timer = QueryTimer()
+        kwargs = {} if method == 'get' else {'format': 'json'}
+        with connection.execute_wrapper(timer):
+            start = time.perf_counter()
+            response = getattr(client, method)(reverse(name, args=args), data, **kwargs)
+            elapsed = time.perf_counter() - start
+        if response.status_code != expected:
+            raise CommandError(f'{method.upper()} {name} answered {response.status_code}: {response.content[:200]}')
+        self.samples[f'{method.upper()} {name}{label}'].append((elapsed, timer.count))
+        return response
+
+    def journey(self, i):
+        """Browse anonymously, then sign up and shop through every authenticated route"""
+        product, other, third = self.rng.sample(self.products, 3)
+        anonymous = self.client_for()
+        self.call(anonymous, 'get', 'category-list')
+        self.call(anonymous, 'get', 'category-detail', [product.category_id])
+        self.call(anonymous, 'get', 'product-list')
+        self.call(anonymous, 'get', 'product-list', data={'category': product.category_id}, label='?category')
+        self.call(anonymous, 'get', 'product-list', data={'search': self.rng.choice(CATEGORIES)}, label='?search')
+        self.call(anonymous, 'get', 'product-detail', [product.pk])
+        self.call(anonymous, 'get', 'review-list', [product.pk])
+        self.call(anonymous, 'get', 'dashboard-stats')
+        self.call(anonymous, 'get', 'async-category-list')
+        self.call(anonymous, 'get', 'async-product-list', data={'search': self.rng.choice(CATEGORIES)})
+        self.call(anonymous, 'get', 'async-product-detail', [product.pk])
+
+        username = f'{PREFIX}-shopper-{i}'
+        credentials = {'username': username, 'password': 'snacks-and-more'}
+        response = self.call(anonymous, 'post', 'register', data={**credentials, 'password_confirm': 'snacks-and-more'},
+                             expected=201)
+        self.call(anonymous, 'post', 'login', data=credentials)
+        client = self.client_for(response.data['token'])
+
+        self.call(client, 'get', 'profile')
+        self.call(client, 'patch', 'profile', data={'address': 'Block C', 'city': 'Lagos'})
+        self.call(client, 'post', 'cart-add', data={'product_id': product.pk, 'quantity': 2}, expected=201)
+        self.call(client, 'post', 'cart-bulk', data={'items': [{'product_id': other.pk, 'quantity': 1},
+                                                             {'product_id': third.pk, 'quantity': 3}]})
+        cart = self.call(client, 'get', 'cart-list').data['results']
+        self.call(client, 'get', 'cart-list', data={'expand': 'product'}, label='?expand')
+        self.call(client, 'patch', 'cart-update', [cart[0]['id']], data={'quantity': 1})
+        self.call(client, 'get', 'cart-summary')
+        self.call(client, 'delete', 'cart-delete', [cart[-1]['id']], expected=204)
+
+        wish = self.call(client, 'post', 'wishlist-add', data={'product_id': third.pk}, expected=201)
+        self.call(client, 'get', 'wishlist-list')
+        self.call(client, 'delete', 'wishlist-delete', [wish.data['id']], expected=204)
+
+        self.call(client, 'post', 'checkout-reserve')
+        order = self.call(client, 'post', 'order-create', data={'shipping_address': 'Block C'}, expected=201)
+        self.call(client, 'delete', 'checkout-reserve', expected=204)
+        self.call(client, 'get', 'order-list')
+        self.call(client, 'get', 'order-list', data={'summary': 1}, label='?summary')
+        self.call(client, 'get', 'order-detail', [order.data['id']])
+        self.call(client, 'post', 'order-reorder', [order.data['id']])
+        self.call(client, 'delete', 'cart-clear')
+        self.call(client, 'post', 'review-create', data={'product_id': product.pk, 'rating': 4}, expected=201)
+        self.call(client, 'get', 'dashboard-stats', label='?user')
+        self.call(client, 'get', 'async-dashboard-stats')
+        self.call(self.admin_client, 'get', 'cache-stats')
+        self.call(self.admin_client, 'get', 'metrics')
+        rotated = self.call(client, 'post', 'token-rotate')
+        self.call(self.client_for(rotated.data['token']), 'post', 'logout')
+
+    def results(self, options, elapsed):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                    capture_output=True, text=True).stdout.strip()
+        except OSError:
+            commit = ''
+        routes = {}
+        for key, samples in sorted(self.samples.items()):
+            latencies = [seconds * 1000 for seconds, _ in samples]
+            queries = [count for _, count in samples]
+            if len(latencies) > 1:
+                p = statistics.quantiles(latencies, n=100, method='inclusive')
+            else:
+                p = latencies * 99
+            routes[key] = {
+                'requests': len(samples),
+                'p50_ms': round(p[49], 3),
+                'p95_ms': round(p[94], 3),
+                'p99_ms': round(p[98], 3),
+                'mean_ms': round(statistics.fmean(latencies), 3),
+                'requests_per_second': round(1000 / statistics.fmean(latencies), 1),
+                'queries': max(queries),
+                'queries_mean': round(statistics.fmean(queries), 2),
+            }
+        total = sum(route['requests'] for route in routes.values())
+        return {
+            'meta': {
+                'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'commit': commit or 'unknown',
+                'database': connection.vendor,
+                'django': django.get_version(),
+                'scale': options['scale'],
+                'iterations': options['iterations'],
+                'seed': options['seed'],
+                'catalog_cache': not options['no_cache'],
+            },
+            'total': {'requests': total, 'seconds': round(elapsed, 3), 'requests_per_second': round(total / elapsed, 1)},
+            'routes': routes,
+        }
+
+    def report(self, results):
+        self.stdout.write(f"{'route':<34}{'n':>5}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'queries':>9}")
+        for key, route in results['routes'].items():
+            self.stdout.write(
+                f"{key:<34}{route['requests']:>5}{route['p50_ms']:>9.2f}{route['p95_ms']:>9.2f}"
+                f"{route['p99_ms']:>9.2f}{route['requests_per_second']:>9.0f}{route['queries']:>9}"
+            )
+        total = results['total']
+        self.stdout.write(f"{total['requests']} requests in {total['seconds']:.1f}s "
+                          f"({total['requests_per_second']:.0f} req/s)")
+
+    def compare(self, before, after):
+        self.stdout.write(f"\nAgainst {before['meta']['commit'][:8]} ({before['meta']['started']}):")
+        self.stdout.write(f"{'route':<34}{'p50':>10}{'p95':>10}{'queries':>10}")
+        for key, route in after['routes'].items():
+            old = before['routes'].get(key)
+            if old is None:
+                self.stdout.write(f'{key:<34}{"new":>10}')
+                continue
+            change = [f"{(route[f] - old[f]) / old[f] * 100 if old[f] else 0:>+9.0f}%" for f in ('p50_ms', 'p95_ms')]
+            self.stdout.write(f"{key:<34}{change[0]}{change[1]}{route['queries'] - old['queries']:>+10}")
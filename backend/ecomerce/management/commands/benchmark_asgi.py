@@ -0,0 +1,159 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+MODULE = 'ecomerce.management.commands.benchmark_asgi'
+SERVERS = {
+    'gunicorn': ['gunicorn', f'{MODULE}:wsgi_application()', '--worker-class', 'gthread',
+                 '--workers', '{workers}', '--threads', '{threads}', '--bind', '127.0.0.1:{port}'],
+    'uvicorn': ['uvicorn', f'{MODULE}:application', '--factory',
+                '--workers', '{workers}', '--port', '{port}', '--log-level', 'warning'],
+}
+# (leg, server, path): the WSGI deployment, then the DRF view and its async
+# counterpart under uvicorn. A unique query parameter per request keeps the
+# response cache out of the way, so every leg does the same database work
+LEGS = [
+    ('wsgi', 'gunicorn', '/api/products/'),
+    ('sync', 'uvicorn', '/api/products/'),
+    ('async', 'uvicorn', '/api/async/products/'),
+]
+QUERY_DELAY_VARIABLE = 'BENCHMARK_QUERY_DELAY_MS'
+
+
+def application():
+    """uvicorn --factory entry point: the project's ASGI app with slow queries"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.core.asgi import get_asgi_application
+
+    app = get_asgi_application()
+    slow_down_queries()
+    return app
+
+
+def wsgi_application():
+    """gunicorn entry point: the project's WSGI app with slow queries"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    slow_down_queries()
+    return app
+
+
+def slow_down_queries():
+    """Make every query first sleep for BENCHMARK_QUERY_DELAY_MS.
+
+    This stands in for the network round trip to a remote database. The
+    sleep blocks the thread running the query, as a real driver does, for
+    every server and view alike.
+    """
+    from django.db.backends.signals import connection_created
+
+    delay = float(os.environ.get(QUERY_DELAY_VARIABLE, 0)) / 1000
+
+    def slow_query(execute, sql, params, many, context):
+        time.sleep(delay)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        if slow_query not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, slow_query)
+
+    if delay:
+        connection_created.connect(install, weak=False)
+
+
+class Command(BaseCommand):
+    help = ('Compare the catalog under gunicorn (WSGI) with the sync and async views under '
+            'uvicorn (ASGI), with many clients and a slow database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query-delay-ms', type=float, default=20.0,
+                            help='Simulated database latency added to every query')
+        parser.add_argument('--requests', type=int, default=300, help='Measured requests per route')
+        parser.add_argument('--concurrency', type=int, default=50, help='Parallel clients')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes per server')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per gunicorn worker')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--legs', default=','.join(leg for leg, _, _ in LEGS),
+                            help='Comma-separated subset of ' + ', '.join(leg for leg, _, _ in LEGS))
+
+    def handle(self, *args, **options):
+        legs = [leg for leg in LEGS if leg[0] in options['legs'].split(',')]
+        env = {**os.environ, QUERY_DELAY_VARIABLE: str(options['query_delay_ms'])}
+        self.stdout.write(
+            f"{options['workers']} worker(s) per server ({options['threads']} threads under gunicorn), "
+            f"{options['query_delay_ms']:g} ms per query, "
+            f"{options['requests']} requests per leg from {options['concurrency']} clients"
+        )
+        self.stdout.write(
+            f"{'leg':<8}{'server':<10}{'route':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+        )
+
+        for server_name in dict.fromkeys(server for _, server, _ in legs):
+            command = [part.format(**options) for part in SERVERS[server_name]]
+            server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                self.wait_for_port(options['port'], server_name)
+                for name, _, path in (leg for leg in legs if leg[1] == server_name):
+                    # One unmeasured round warms connections and imports
+                    asyncio.run(self.load(path, options, options['concurrency']))
+                    latencies, elapsed = asyncio.run(self.load(path, options, options['requests']))
+                    p = statistics.quantiles(latencies, n=100)
+                    self.stdout.write(
+                        f'{name:<8}{server_name:<10}{path:<24}{p[49]:>10.1f}{p[94]:>10.1f}{p[98]:>10.1f}'
+                        f'{len(latencies) / elapsed:>10.0f}'
+                    )
+            finally:
+                server.terminate()
+                server.wait()
+
+    def wait_for_port(self, port, server_name, timeout=20):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError(f'{server_name} did not start on port {port} (is it installed?)')
+
+    async def request(self, port, path):
+        """One HTTP/1.1 GET, failing on anything but a 200"""
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        try:
+            writer.write(
+                f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: application/json\r\n'
+                f'Connection: close\r\n\r\n'.encode()
+            )
+            await writer.drain()
+            status = (await reader.readline()).split()[1]
+            await reader.read()
+            if status != b'200':
+                raise CommandError(f'{path} answered {status.decode()}')
+        finally:
+            writer.close()
+
+    async def load(self, path, options, total):
+        port = options['port']
+        latencies = []
+        sent = 0
+
+        async def client():
+            nonlocal sent
+            while sent < total:
+                sent += 1
+                start = time.perf_counter()
+                await self.request(port, f'{path}?bench={time.monotonic_ns()}-{sent}')
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        return latencies, time.perf_counter() - start
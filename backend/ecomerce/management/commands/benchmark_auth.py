@@ -0,0 +1,65 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from ecomerce.authentication import CachedTokenAuthentication, local_tokens, token_cache_key
+
+ENDPOINTS = [
+    'profile', 'cart-list', 'cart-summary', 'order-list', 'wishlist-list', 'dashboard-stats',
+]
+
+
+class Command(BaseCommand):
+    help = 'Show the database queries and time saved by cached token authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # The throwaway user and its token are rolled back with the transaction
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark-auth')
+            token = Token.objects.create(user=user)
+            client = APIClient(SERVER_NAME='localhost')
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            self.stdout.write(f"{'endpoint':<18}{'cold queries':>14}{'cached queries':>16}")
+            for name in ENDPOINTS:
+                # Warm the view's own caches first so only authentication differs
+                self.count_queries(client, name)
+                self.forget(token.key)
+                cold = self.count_queries(client, name)
+                cached = self.count_queries(client, name)
+                self.stdout.write(f'{name:<18}{cold:>14}{cached:>16}')
+
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Token {token.key}')
+            self.stdout.write('')
+            for authentication in (TokenAuthentication(), CachedTokenAuthentication()):
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    authentication.authenticate(request)
+                    timings.append((time.perf_counter() - start) * 1e6)
+                self.stdout.write(
+                    f'{type(authentication).__name__:<28} p50 {statistics.median(timings):>7.1f} us'
+                )
+            transaction.set_rollback(True)
+        self.forget(token.key)
+
+    def forget(self, key):
+        local_tokens.delete(key)
+        cache.delete(token_cache_key(key))
+
+    def count_queries(self, client, name):
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(reverse(name))
+        return len(ctx.captured_queries)
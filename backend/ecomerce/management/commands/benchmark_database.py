@@ -0,0 +1,133 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ecomerce.models import Cart, Category, Order, Product
+
+PREFIX = 'dbbench'
+
+
+class Command(BaseCommand):
+    help = 'Measure request throughput of the API against the configured database profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Requests per thread for each scenario')
+        parser.add_argument('--profiles',
+                            help='Comma-separated DB_PROFILE values to run one after another and compare')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        if options['profiles']:
+            return self.compare(options)
+
+        results = self.run(options['threads'], options['requests'])
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"Profile: {settings.DB_PROFILE} ({connection.vendor})")
+        self.report({settings.DB_PROFILE: results})
+
+    def compare(self, options):
+        # Each profile needs its own settings, so run it in a fresh process
+        results = {}
+        for profile in options['profiles'].split(','):
+            self.stdout.write(f'Running {profile}...')
+            completed = subprocess.run(
+                [sys.executable, sys.argv[0], 'benchmark_database', '--json',
+                 '--threads', str(options['threads']), '--requests', str(options['requests'])],
+                env={**os.environ, 'DB_PROFILE': profile},
+                capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise CommandError(f'{profile} failed:\n{completed.stderr}')
+            results[profile] = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.report(results)
+
+    def report(self, results):
+        scenarios = next(iter(results.values())).keys()
+        self.stdout.write(f"{'scenario':<16}" + ''.join(f'{profile:>16}' for profile in results))
+        for scenario in scenarios:
+            self.stdout.write(
+                f'{scenario:<16}' + ''.join(f'{results[p][scenario]:>12.0f} r/s' for p in results)
+            )
+
+    def run(self, threads, requests):
+        users, products = self.seed(threads)
+        try:
+            # Measure the database, not the catalog response cache, and
+            # without the query logging and budget checks DEBUG turns on
+            with override_settings(CATALOG_CACHE_TTL=0, DEBUG=False, QUERY_BUDGET_MODE=None):
+                return self.run_scenarios(users, products, threads, requests)
+        finally:
+            self.cleanup()
+
+    def run_scenarios(self, users, products, threads, requests):
+        product_ids = [product.pk for product in products]
+        scenarios = {
+            'product list': lambda client, i: client.get(reverse('product-list')),
+            'product detail': lambda client, i: client.get(
+                reverse('product-detail', args=[product_ids[i % len(product_ids)]])
+            ),
+            'cart add': lambda client, i: client.post(
+                reverse('cart-add'), {'product_id': product_ids[i % len(product_ids)], 'quantity': 1}
+            ),
+            'checkout': self.checkout(product_ids),
+        }
+        return {
+            name: self.throughput(users, threads, requests, request)
+            for name, request in scenarios.items()
+        }
+
+    def checkout(self, product_ids):
+        def request(client, i):
+            client.post(reverse('cart-add'), {'product_id': product_ids[i % len(product_ids)], 'quantity': 1})
+            return client.post(reverse('order-create'), {'shipping_address': 'Benchmark'})
+        return request
+
+    def throughput(self, users, threads, requests, request):
+        def worker(user):
+            client = APIClient(SERVER_NAME='localhost')
+            client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(user=user)[0].key)
+            try:
+                for i in range(requests):
+                    response = request(client, i)
+                    if response.status_code >= 500:
+                        raise CommandError(f'{response.status_code} from {response.wsgi_request.path}')
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, users))
+        return threads * requests / (time.perf_counter() - start)
+
+    def seed(self, threads):
+        self.cleanup()
+        category = Category.objects.create(name=f'{PREFIX} snacks')
+        products = Product.objects.bulk_create([
+            Product(name=f'{PREFIX} snack {i}', price=1, stock=10 ** 6, category=category)
+            for i in range(50)
+        ])
+        users = [User.objects.create_user(username=f'{PREFIX}{i}') for i in range(threads)]
+        return users, products
+
+    def cleanup(self):
+        Order.objects.filter(user__username__startswith=PREFIX).delete()
+        Cart.objects.filter(user__username__startswith=PREFIX).delete()
+        User.objects.filter(username__startswith=PREFIX).delete()
+        Product.objects.filter(name__startswith=PREFIX).delete()
+        Category.objects.filter(name__startswith=PREFIX).delete()
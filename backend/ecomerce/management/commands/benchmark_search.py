@@ -0,0 +1,78 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from ecomerce.models import Category, Product
+from ecomerce.search import ScanSearchBackend, get_search_backend
+
+WORDS = [
+    'crispy', 'salty', 'sweet', 'spicy', 'chocolate', 'caramel', 'peanut', 'almond', 'cheese',
+    'onion', 'barbecue', 'vanilla', 'strawberry', 'mango', 'lemon', 'honey', 'oat', 'protein',
+    'crunchy', 'chewy', 'roasted', 'baked', 'organic', 'classic', 'mini', 'family', 'double',
+]
+NOUNS = ['chips', 'crackers', 'cookies', 'bar', 'juice', 'soda', 'tea', 'nuts', 'gummies', 'shake']
+
+
+class Command(BaseCommand):
+    help = ('Compare product search latency of the full-text index against the original '
+            'icontains phrase query and a per-word icontains scan')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        queries = ['choc', 'crispy chips', 'peanut butter', 'strawberry shake', 'xyzzy']
+
+        # The seeded products and their index entries are rolled back, so
+        # the benchmark can run against a real database
+        with transaction.atomic():
+            self.seed(options['products'], rng)
+            indexed = get_search_backend()
+            scan = ScanSearchBackend()
+            base = Product.objects.filter(is_active=True).order_by('-created_at', '-id')
+
+            self.stdout.write(
+                f"{'query':<20}{'phrase p50 ms':>15}{'scan p50 ms':>14}{'index p50 ms':>14}{'speedup':>10}"
+            )
+            for query in queries:
+                # Before: ProductListView's original filter on the whole phrase
+                phrase = base.filter(Q(name__icontains=query) | Q(description__icontains=query))
+                phrase_ms = self.time_query(phrase, options['repeat'])
+                scan_ms = self.time_query(scan.search(base, query), options['repeat'])
+                index_ms = self.time_query(indexed.search(base, query), options['repeat'])
+                self.stdout.write(
+                    f'{query:<20}{phrase_ms:>15.2f}{scan_ms:>14.2f}{index_ms:>14.2f}{phrase_ms / index_ms:>9.1f}x'
+                )
+            transaction.set_rollback(True)
+
+    def seed(self, count, rng):
+        self.stdout.write(f'Seeding {count} products...')
+        category = Category.objects.create(name=f'Benchmark {rng.random()}')
+        products = Product.objects.bulk_create([
+            Product(
+                name=f'{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {rng.choice(NOUNS).title()}',
+                description=' '.join(rng.choice(WORDS + NOUNS) for _ in range(12)),
+                price=rng.randint(50, 1000) / 100,
+                stock=rng.randint(0, 100),
+                category=category,
+            )
+            for _ in range(count)
+        ], batch_size=5000)
+        get_search_backend().index_products(products)
+
+    def time_query(self, queryset, repeat):
+        # Same work as one ProductListView page: a count and the first page
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            queryset.count()
+            list(queryset[:20])
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
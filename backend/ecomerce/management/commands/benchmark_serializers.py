@@ -0,0 +1,79 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from django.contrib.auth.models import User
+from ecomerce.models import Cart, Category, Order, OrderItem, Product, Review, Wishlist
+from ecomerce.serializers import CartItemSerializer, OrderSerializer, ReviewSerializer, WishlistSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare payload size and serialization time of compact and expanded embedded products'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        payloads = self.build_payloads(rows)
+
+        self.stdout.write(
+            f"{'serializer':<22}{'compact KB':>12}{'full KB':>10}{'compact ms':>12}{'full ms':>10}"
+        )
+        for name, (serializer_class, instances) in payloads.items():
+            compact = self.measure(serializer_class, instances, '/', repeat)
+            full = self.measure(serializer_class, instances, '/?expand=product', repeat)
+            self.stdout.write(
+                f'{name:<22}{compact[0] / 1024:>12.1f}{full[0] / 1024:>10.1f}'
+                f'{compact[1]:>12.2f}{full[1]:>10.2f}'
+            )
+
+    def build_payloads(self, rows):
+        # Unsaved instances, so only serialization and rendering are timed
+        now = timezone.now()
+        user = User(id=1, username='student', email='student@example.com')
+        category = Category(id=1, name='Snacks', description='Delicious snacks and treats',
+                            image='https://images.example.com/snacks.jpg')
+        products = [
+            Product(id=i, name=f'Snack {i}', description='Crispy and salty potato chips made from '
+                    'premium potatoes, cooked in small batches for extra crunch. ' * 3,
+                    price=Decimal('2.99'), stock=50, category=category, rating_sum=40, rating_count=10,
+                    image=f'https://images.example.com/{i}.jpg', created_at=now, updated_at=now)
+            for i in range(1, rows + 1)
+        ]
+        order = Order(id=1, user=user, total_amount=Decimal('149.50'), shipping_address='Block A',
+                      created_at=now, updated_at=now)
+        order._prefetched_objects_cache = {'items': [
+            OrderItem(id=p.id, order=order, product=p, quantity=2, price=p.price) for p in products
+        ]}
+        return {
+            'CartItemSerializer': (CartItemSerializer, [
+                Cart(id=p.id, user=user, product=p, quantity=2, created_at=now) for p in products
+            ]),
+            'OrderSerializer': (OrderSerializer, [order]),
+            'ReviewSerializer': (ReviewSerializer, [
+                Review(id=p.id, user=user, product=p, rating=4, comment='Great', created_at=now)
+                for p in products
+            ]),
+            'WishlistSerializer': (WishlistSerializer, [
+                Wishlist(id=p.id, user=user, product=p, created_at=now) for p in products
+            ]),
+        }
+
+    def measure(self, serializer_class, instances, path, repeat):
+        request = Request(APIRequestFactory().get(path))
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = JSONRenderer().render(
+                serializer_class(instances, many=True, context={'request': request}).data
+            )
+            timings.append((time.perf_counter() - start) * 1000)
+        return len(content), statistics.median(timings)
@@ -1,11 +1,24 @@
-from django.core.management.base import BaseCommand
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth.models import User
 from ecomerce.models import Category, Product, Profile
+from ecomerce.synthetic import PASSWORD, SyntheticData
 from decimal import Decimal
 
 
 class Command(BaseCommand):
-    help = 'Populate database with sample data'
+    help = 'Populate database with sample data, plus any number of synthetic rows for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0, help='Synthetic users (with profiles) to create')
+        parser.add_argument('--products', type=int, default=0, help='Synthetic products to create')
+        parser.add_argument('--orders', type=int, default=0, help='Synthetic orders to create')
+        parser.add_argument('--reviews', type=int, default=0, help='Synthetic reviews to create')
+        parser.add_argument('--items-per-order', type=int, default=5, help='Most items in a synthetic order')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same rows')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Rows per transaction')
 
     def handle(self, *args, **options):
         self.stdout.write('Creating sample data...')
@@ -173,3 +186,36 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS('Successfully populated database with sample data!')
         )
+
+        if any(options[name] for name in ('users', 'products', 'orders', 'reviews')):
+            self.generate(options)
+
+    def generate(self, options):
+        started = time.perf_counter()
+
+        def progress(label, done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'  {label}: {done}/{total} ({generator.rows / elapsed:,.0f} rows/s)')
+
+        generator = SyntheticData(seed=options['seed'], chunk_size=options['chunk_size'], progress=progress)
+        self.stdout.write('Creating synthetic data...')
+        try:
+            rows = generator.generate(
+                users=options['users'], products=options['products'], orders=options['orders'],
+                reviews=options['reviews'], items_per_order=options['items_per_order'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        # SyntheticData writes with raw executemany INSERTs, so no model signals
+        # ran: rebuild the rating totals and the search index they would keep
+        if options['reviews']:
+            call_command('rebuild_ratings', stdout=self.stdout)
+        if options['products']:
+            call_command('rebuild_search_index', stdout=self.stdout)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {rows:,} synthetic rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s). '
+            f"Synthetic users log in with the password '{PASSWORD}'."
+        ))
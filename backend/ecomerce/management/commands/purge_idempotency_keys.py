@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from ecomerce.idempotency import expired_before
+from ecomerce.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL'
+
+    def handle(self, *args, **options):
+        # A client that reuses an expired key gets it replaced on the spot;
+        # this removes the keys nobody sends again
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lte=expired_before()).delete()
+        self.stdout.write(
+            self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys')
+        )
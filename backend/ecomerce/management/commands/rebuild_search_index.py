@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ecomerce.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Recreate the product full-text search index from the products table'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        self.stdout.write(f'Rebuilding search index with {type(backend).__name__}...')
+
+        with transaction.atomic():
+            backend.create_index()
+            backend.rebuild()
+
+        self.stdout.write(self.style.SUCCESS('Successfully rebuilt the search index!'))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ecomerce.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Delete expired stock reservations, once or repeatedly with --interval'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running and sweep every N seconds')
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            # held_quantities() only counts unexpired holds, so a missed sweep
+            # never blocks a sale; sweeping stops the table growing
+            deleted, _ = StockReservation.objects.expired().delete()
+            self.stdout.write(
+                self.style.SUCCESS(f'Released {deleted} expired reservations')
+            )
+            if not interval:
+                break
+            time.sleep(interval)
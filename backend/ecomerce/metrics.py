@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One slot per bucket plus +Inf; made cumulative when exported
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class ViewMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db_seconds = 0.0
+        self.response_bytes = 0
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def record_request(view, method, seconds, queries, db_seconds, response_bytes):
+    with _lock:
+        metrics = _views.get((view, method))
+        if metrics is None:
+            metrics = _views[(view, method)] = ViewMetrics()
+        metrics.latency.observe(seconds)
+        metrics.queries.observe(queries)
+        metrics.db_seconds += db_seconds
+        metrics.response_bytes += response_bytes
+
+
+def reset_metrics():
+    with _lock:
+        _views.clear()
+
+
+def _histogram_lines(name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+    yield f'{name}_sum{{{labels}}} {histogram.sum}'
+    yield f'{name}_count{{{labels}}} {histogram.count}'
+
+
+def render_metrics():
+    """All recorded metrics in the Prometheus text exposition format"""
+    with _lock:
+        views = sorted(_views.items())
+        families = {
+            'http_request_duration_seconds': ('histogram', 'Request latency by URL name'),
+            'db_queries_per_request': ('histogram', 'Database queries per request'),
+            'db_query_duration_seconds_total': ('counter', 'Time spent in database queries'),
+            'http_response_size_bytes_total': ('counter', 'Bytes of response bodies'),
+        }
+        lines = []
+        for name, (kind, help_text) in families.items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            for (view, method), metrics in views:
+                labels = f'view="{view}",method="{method}"'
+                if name == 'http_request_duration_seconds':
+                    lines.extend(_histogram_lines(name, labels, metrics.latency))
+                elif name == 'db_queries_per_request':
+                    lines.extend(_histogram_lines(name, labels, metrics.queries))
+                elif name == 'db_query_duration_seconds_total':
+                    lines.append(f'{name}{{{labels}}} {metrics.db_seconds}')
+                else:
+                    lines.append(f'{name}{{{labels}}} {metrics.response_bytes}')
+    return '\n'.join(lines) + '\n'
+
+
+_query_observers = ContextVar('query_observers', default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    """Execute wrapper on every connection that runs the current observers.
+
+    Observers live in a context variable rather than on a connection, so
+    they follow a request into the threads sync_to_async runs its queries
+    in, whichever connection those threads use.
+    """
+    for observer in reversed(_query_observers.get()):
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_query_observer(sender, connection, **kwargs):
+    """connection_created receiver; first in the list so execute_wrapper() blocks still pop their own"""
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observe_queries)
+
+
+@contextmanager
+def observing_queries(observer):
+    """Pass every query run in this context, on any connection, through ``observer``"""
+    token = _query_observers.set(_query_observers.get() + (observer,))
+    try:
+        yield
+    finally:
+        _query_observers.reset(token)
+
+
+class QueryTimer:
+    """connection.execute_wrapper that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class MetricsMiddleware:
+    """Record latency, query count, DB time and response size per URL name.
+
+    Removed from the stack entirely unless METRICS_ENABLED is set. Requests
+    slower than SLOW_REQUEST_THRESHOLD_MS (when set) are logged as warnings.
+    Runs natively under both WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_threshold = getattr(settings, 'SLOW_REQUEST_THRESHOLD_MS', None)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with observing_queries(timer):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with observing_queries(timer):
+            response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def record(self, request, response, seconds, timer):
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match else '<unresolved>'
+        size = 0 if response.streaming else len(response.content)
+        record_request(view, request.method, seconds, timer.count, timer.seconds, size)
+
+        if self.slow_threshold is not None and seconds * 1000 >= self.slow_threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.0f ms, %d queries in %.0f ms, %d bytes',
+                request.method, request.get_full_path(), view, seconds * 1000,
+                timer.count, timer.seconds * 1000, size,
+            )
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:40
+
+from django.db import migrations
+
+# The DDL is written out here rather than taken from ecomerce.search, so
+# this migration keeps doing the same thing whatever that module becomes
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS ecomerce_product_search USING fts5("
+            "name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute(
+            'INSERT INTO ecomerce_product_search (rowid, name, description) '
+            'SELECT id, name, description FROM ecomerce_product'
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS ecomerce_product_search_idx ON ecomerce_product USING GIN (("
+            "setweight(to_tsvector('simple'::regconfig, COALESCE((name)::text, '')), 'A') || "
+            "setweight(to_tsvector('simple'::regconfig, COALESCE((description)::text, '')), 'B')))"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS ecomerce_product_search')
+    elif vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS ecomerce_product_search_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecomerce', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
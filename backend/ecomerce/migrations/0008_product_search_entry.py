@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecomerce', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='ecomerce.product')),
+                ('document', models.TextField(db_column='ecomerce_product_search')),
+            ],
+            options={
+                'db_table': 'ecomerce_product_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,5 +1,11 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import (
+    Case, Count, DecimalField, ExpressionWrapper, F, IntegerField, OuterRef, Subquery, Sum, Value, When, Window
+)
+from django.db.models.functions import Coalesce, Greatest
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -25,23 +31,74 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     image = models.URLField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Denormalized review aggregates, maintained by the Review signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Partial indexes: only active products are ever listed, and the
+            # storefront's newest-first ordering is read straight off them
+            models.Index(fields=['created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_active_created_idx'),
+            models.Index(fields=['category', 'created_at', 'id'], condition=models.Q(is_active=True),
+                         name='product_cat_active_idx'),
+        ]
+
     def __str__(self):
         return self.name
     
     @property
     def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum([review.rating for review in reviews]) / len(reviews)
+        if self.rating_count:
+            return self.rating_sum / self.rating_count
         return 0
 
     @property
     def is_in_stock(self):
         return self.stock > 0
 
+    def available_stock(self, held=0):
+        """Units that can still be promised once ``held`` units are reserved"""
+        if not self.is_active:
+            return 0
+        return max(self.stock - held, 0)
+
+
+class Match(models.Lookup):
+    """SQLite FTS5 full-text ``MATCH``"""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class ProductSearchEntry(models.Model):
+    """A product's row in the SQLite FTS5 search index, for joining in queries.
+
+    Migration 0004 creates the virtual table and SQLiteFTS5SearchBackend
+    writes to it, so Django never manages it. Other databases have no such
+    table and never query this model.
+    """
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_entry',
+    )
+    # FTS5's hidden column named after the table: MATCH against it searches
+    # every column, and ranking functions take it as their first argument
+    document = models.TextField(db_column='ecomerce_product_search')
+
+    class Meta:
+        managed = False
+        db_table = 'ecomerce_product_search'
+
+
+ProductSearchEntry._meta.get_field('document').register_lookup(Match)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -57,6 +114,79 @@ class Profile(models.Model):
         return f"Profile of {self.user.username}"
 
 
+class CartQuerySet(models.QuerySet):
+    def available_stock(self):
+        """SQL for the units each line's product can still promise its user.
+
+        Mirrors ``Product.available_stock``: nothing for inactive products,
+        and stock held by other users' unexpired reservations is left out.
+        """
+        held = Subquery(
+            StockReservation.objects.active()
+            .filter(product_id=OuterRef('product_id'))
+            .exclude(user_id=OuterRef('user_id'))
+            .order_by().values('product_id').annotate(held=Sum('quantity')).values('held'),
+            output_field=IntegerField(),
+        )
+        return Case(
+            When(product__is_active=True, then=Greatest(F('product__stock') - Coalesce(held, 0), Value(0))),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+
+    def with_totals(self):
+        """Annotate line totals, stock shortfalls and whole-cart totals.
+
+        The cart totals are window aggregates over the filtered rows, so the
+        lines and the summary come back from a single query.
+        """
+        line_total = ExpressionWrapper(
+            F('product__price') * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        available = self.available_stock()
+        return self.select_related('product').annotate(
+            line_total=line_total,
+            stock_shortfall=Greatest(
+                ExpressionWrapper(F('quantity') - available, output_field=IntegerField()),
+                Value(0),
+            ),
+            cart_subtotal=Window(Sum(line_total)),
+            cart_item_count=Window(Sum('quantity')),
+        )
+
+    def add_quantity(self, user, product_id, quantity):
+        """Add to an existing cart line with ``SET quantity = quantity + n``.
+
+        The addition and the stock check are one conditional UPDATE, so
+        concurrent adds are never lost and can't take the line past the
+        available stock. Returns the number of lines updated: 0 if there is
+        no line yet or the new quantity would be more than is available.
+        """
+        return self.filter(
+            user=user, product_id=product_id, quantity__lte=self.available_stock() - quantity
+        ).update(quantity=F('quantity') + quantity, updated_at=timezone.now())
+
+    def set_quantities(self, user, quantities):
+        """Write {product_id: quantity} for a user's cart in one upsert.
+
+        New lines are inserted, existing ones overwritten, and products set
+        to zero are removed.
+        """
+        self.bulk_create(
+            [
+                self.model(user=user, product_id=product_id, quantity=quantity)
+                for product_id, quantity in quantities.items() if quantity > 0
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+        removed = [product_id for product_id, quantity in quantities.items() if quantity <= 0]
+        if removed:
+            self.filter(user=user, product_id__in=removed).delete()
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
@@ -64,6 +194,8 @@ class Cart(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'product')
 
@@ -75,6 +207,20 @@ class Cart(models.Model):
         return self.product.price * self.quantity
 
 
+class OrderQuerySet(models.QuerySet):
+    def with_item_summary(self):
+        """Annotate ``item_count`` (lines) and ``item_quantity`` (units) per order.
+
+        Both are correlated subqueries over the order's items, so the order
+        rows are neither multiplied by a join nor regrouped.
+        """
+        items = OrderItem.objects.filter(order=OuterRef('pk')).order_by().values('order')
+        return self.annotate(
+            item_count=Coalesce(Subquery(items.annotate(n=Count('pk')).values('n')), 0),
+            item_quantity=Coalesce(Subquery(items.annotate(n=Sum('quantity')).values('n')), 0),
+        )
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -91,6 +237,14 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order {self.id} by {self.user.username}"
 
@@ -119,6 +273,9 @@ class Review(models.Model):
 
     class Meta:
         unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', 'created_at', 'id'], name='review_product_created_idx'),
+        ]
 
     def __str__(self):
         return f"Review {self.id} for {self.product.name} by {self.user.username}"
@@ -133,4 +290,70 @@ class Wishlist(models.Model):
         unique_together = ('user', 'product')
 
     def __str__(self):
-        return f"{self.user.username}'s wishlist item: {self.product.name}"
\ No newline at end of file
+        return f"{self.user.username}'s wishlist item: {self.product.name}"
+
+
+class StockReservationQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+    def held_quantities(self, product_ids, exclude_user=None):
+        """Units held by unexpired reservations, as {product_id: quantity}.
+
+        A user's own holds are left out with ``exclude_user``, since they are
+        the stock that user is entitled to.
+        """
+        holds = self.active().filter(product_id__in=product_ids)
+        if exclude_user is not None:
+            holds = holds.exclude(user=exclude_user)
+        return dict(
+            holds.order_by().values('product_id').annotate(held=Sum('quantity')).values_list('product_id', 'held')
+        )
+
+
+class StockReservation(models.Model):
+    """Stock set aside for a user's checkout until ``expires_at``"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StockReservationQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_exp_idx'),
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held for {self.user.username}"
+
+
+class IdempotencyKey(models.Model):
+    """The first successful response to a request sent with an Idempotency-Key.
+
+    The row is inserted in the same transaction as the view's own writes, so
+    the unique (user, key) constraint lets only one request per key through,
+    whichever process handles it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'key')
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}'s idempotency key {self.key}"
@@ -0,0 +1,119 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+PIN_KEY = 'replica-pin:{}'
+# Models whose reads may be served by the replica
+REPLICATED_MODELS = {'ecomerce.category', 'ecomerce.product', 'ecomerce.review'}
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Let the router send catalog reads in this block to READ_REPLICA"""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_from_replica():
+    """Whether catalog reads in the current context are routed to the replica"""
+    return bool(getattr(settings, 'READ_REPLICA', None)) and _replica_reads.get()
+
+
+def pin_to_primary(user):
+    """Read this user's catalog data from the primary for REPLICA_PIN_SECONDS"""
+    cache.set(PIN_KEY.format(user.pk), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(PIN_KEY.format(user.pk)) is not None
+
+
+class ReplicaRouter:
+    """Route catalog reads to READ_REPLICA inside replica_reads(), all else to default.
+
+    Only the public catalog views opt in, so stock checks and anything else
+    that must see its own writes keep reading from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = getattr(settings, 'READ_REPLICA', None)
+        if replica and _replica_reads.get() and model._meta.label_lower in REPLICATED_MODELS:
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != getattr(settings, 'READ_REPLICA', None)
+
+
+class ReplicaReadMixin:
+    """Serve a read-only view from the replica unless the user just wrote.
+
+    List it first, before CachedResponseMixin, so the validator and cache
+    miss queries are routed too.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not getattr(settings, 'READ_REPLICA', None) or is_pinned(request.user):
+            return super().get(request, *args, **kwargs)
+        with replica_reads():
+            return super().get(request, *args, **kwargs)
+
+
+class PinWritersToPrimaryMiddleware:
+    """Pin users to the primary after a successful unsafe request.
+
+    This gives the replica time to catch up, so users always see their own
+    reviews and checkouts. DRF stores the token-authenticated user on the
+    Django request, so it is visible here once the view has run.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Reads (every async view) never leave the event loop; the user may
+        # still be a lazy session lookup, so pinning runs in a thread
+        if self.wrote(request, response):
+            await sync_to_async(self.pin)(request)
+        return response
+
+    def wrote(self, request, response):
+        return (
+            getattr(settings, 'READ_REPLICA', None)
+            and request.method not in ('GET', 'HEAD', 'OPTIONS')
+            and response.status_code < 400
+        )
+
+    def pin(self, request):
+        if getattr(request, 'user', None) is not None and request.user.is_authenticated:
+            pin_to_primary(request.user)
@@ -0,0 +1,178 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchBackend:
+    """Keeps a product search index in sync and answers ranked prefix queries.
+
+    ``search`` returns the queryset filtered to matching products, annotated
+    with ``search_rank`` (lower is better) and ordered by it.
+    """
+    def __init__(self, using='default'):
+        self.using = using
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def index_products(self, products):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def search(self, queryset, text):
+        raise NotImplementedError
+
+
+class ScanSearchBackend(SearchBackend):
+    """Unindexed LIKE scan, for databases without a full-text engine"""
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        for token in tokens:
+            queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token))
+        return queryset
+
+
+class SQLiteFTS5SearchBackend(SearchBackend):
+    """FTS5 inverted index stored in a virtual table keyed by product id"""
+    table = 'ecomerce_product_search'
+    # bm25() weights: product names count for much more than descriptions
+    column_weights = (10.0, 1.0)
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+                f"name, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index_products(self, products):
+        rows = [(p.pk, p.name, p.description or '') for p in products]
+        if not rows:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)', rows
+            )
+
+    def remove_products(self, product_ids):
+        with self.connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in product_ids])
+
+    def rebuild(self):
+        from .models import Product
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, name, description) '
+                f'SELECT id, name, description FROM {Product._meta.db_table}'
+            )
+
+    def match_expression(self, tokens):
+        # Every word must match, the last one as a prefix for type-ahead
+        terms = [f'"{token}"' for token in tokens]
+        terms[-1] += '*'
+        return ' AND '.join(terms)
+
+    def search(self, queryset, text):
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset
+        # Joined through ProductSearchEntry, so bm25() ranks each row from
+        # the same MATCH that selected it
+        rank = Func(
+            F('search_entry__document'), *(Value(weight) for weight in self.column_weights),
+            function='bm25', output_field=FloatField(),
+        )
+        return queryset.filter(
+            search_entry__document__match=self.match_expression(tokens)
+        ).annotate(search_rank=rank).order_by('search_rank', '-created_at', '-id')
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector search backed by a GIN expression index, kept current by Postgres"""
+    index_name = 'ecomerce_product_search_idx'
+    config = 'simple'
+
+    def vector(self):
+        from django.contrib.postgres.search import SearchVector
+
+        return (
+            SearchVector('name', weight='A', config=self.config)
+            + SearchVector('description', weight='B', config=self.config)
+        )
+
+    def create_index(self):
+        from .models import Product
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index_name} ON {Product._meta.db_table} USING GIN (("
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE((name)::text, '')), 'A') || "
+                f"setweight(to_tsvector('{self.config}'::regconfig, COALESCE((description)::text, '')), 'B')))"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX IF EXISTS {self.index_name}')
+
+    def search(self, queryset, text):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        tokens = tokenize(text)
+        if not tokens:
+            return queryset
+        query = SearchQuery(
+            ' & '.join(f'{token}:*' for token in tokens), search_type='raw', config=self.config
+        )
+        vector = self.vector()
+        return queryset.annotate(
+            search_document=vector, search_rank=-SearchRank(vector, query)
+        ).filter(search_document=query).order_by('search_rank', '-created_at', '-id')
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTS5SearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_search_backend(using='default'):
+    """Return the PRODUCT_SEARCH_BACKEND, or the best backend for the database"""
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        backend_class = import_string(backend_path)
+    else:
+        backend_class = VENDOR_BACKENDS.get(connections[using].vendor, ScanSearchBackend)
+    return backend_class(using)
+
+
+def search_products(queryset, text):
+    return get_search_backend(queryset.db).search(queryset, text)
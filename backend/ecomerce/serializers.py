@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, Wishlist
+from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, StockReservation, Wishlist
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -46,6 +46,7 @@ class ProductSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
     category_id = serializers.IntegerField(write_only=True)
     average_rating = serializers.ReadOnlyField()
+    review_count = serializers.IntegerField(source='rating_count', read_only=True)
     is_in_stock = serializers.ReadOnlyField()
 
     class Meta:
@@ -53,12 +54,47 @@ class ProductSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'description', 'price', 'stock', 'category', 
             'category_id', 'image', 'is_active', 'average_rating', 
-            'is_in_stock', 'created_at', 'updated_at'
+            'review_count', 'is_in_stock', 'created_at', 'updated_at'
         ]
 
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class ProductSummarySerializer(serializers.ModelSerializer):
+    """Compact product embedded in cart, order, review and wishlist rows"""
+    is_in_stock = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Product
+        fields = ['id', 'name', 'price', 'image', 'is_in_stock']
+
+
+def expansions(request):
+    return request.query_params.get('expand', '').split(',')
+
+
+def expand_requested(context, name):
+    request = context.get('request')
+    if request is None:
+        return False
+    return name in expansions(request)
+
+
+def product_related(request):
+    """The product relation to select_related for an ExpandableProductMixin serializer"""
+    return 'product__category' if 'product' in expansions(request) else 'product'
+
+
+class ExpandableProductMixin:
+    """Embed ProductSummarySerializer, or the full product with ?expand=product"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if expand_requested(self.context, 'product'):
+            fields['product'] = ProductSerializer(read_only=True)
+        return fields
+
+
+class CartItemSerializer(ExpandableProductMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
     total_price = serializers.ReadOnlyField()
 
@@ -73,18 +109,58 @@ class CartItemSerializer(serializers.ModelSerializer):
         if product_id:
             try:
                 product = Product.objects.get(id=product_id)
-                if quantity > product.stock:
-                    raise serializers.ValidationError(f"Only {product.stock} items in stock")
                 if not product.is_active:
                     raise serializers.ValidationError("Product is not available")
+                # Stock reserved by other users' checkouts cannot be promised
+                request = self.context.get('request')
+                held = StockReservation.objects.held_quantities(
+                    [product.pk], exclude_user=request.user if request else None
+                ).get(product.pk, 0)
+                available = product.available_stock(held)
+                if quantity > available:
+                    raise serializers.ValidationError(f"Only {available} items in stock")
             except Product.DoesNotExist:
                 raise serializers.ValidationError("Product does not exist")
         
         return attrs
 
+    def update(self, instance, validated_data):
+        # Write only the submitted columns rather than re-saving the whole row
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
 
-class OrderItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+
+class CartBulkOperationSerializer(serializers.Serializer):
+    ACTION_CHOICES = ['add', 'set', 'remove']
+
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    action = serializers.ChoiceField(choices=ACTION_CHOICES, default='add')
+
+
+class CartBulkSerializer(serializers.Serializer):
+    items = CartBulkOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_items(self, items):
+        # One query for every product in the batch
+        products = Product.objects.in_bulk({item['product_id'] for item in items})
+        errors = {}
+        for index, item in enumerate(items):
+            product = products.get(item['product_id'])
+            if product is None:
+                errors[index] = ["Product does not exist"]
+            elif not product.is_active and item['action'] != 'remove':
+                errors[index] = ["Product is not available"]
+        if errors:
+            raise serializers.ValidationError(errors)
+        self.products = products
+        return items
+
+
+class OrderItemSerializer(ExpandableProductMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
     total_price = serializers.ReadOnlyField()
 
     class Meta:
@@ -104,9 +180,22 @@ class OrderSerializer(serializers.ModelSerializer):
         ]
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class OrderSummarySerializer(serializers.ModelSerializer):
+    """Order header with item totals, for ?summary=1 listings"""
+    item_count = serializers.IntegerField(read_only=True)
+    item_quantity = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Order
+        fields = [
+            'id', 'status', 'total_amount', 'item_count', 'item_quantity',
+            'created_at', 'updated_at'
+        ]
+
+
+class ReviewSerializer(ExpandableProductMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    product = ProductSerializer(read_only=True)
+    product = ProductSummarySerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -119,8 +208,8 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
 
-class WishlistSerializer(serializers.ModelSerializer):
-    product = ProductSerializer(read_only=True)
+class WishlistSerializer(ExpandableProductMixin, serializers.ModelSerializer):
+    product = ProductSummarySerializer(read_only=True)
     product_id = serializers.IntegerField(write_only=True)
 
     class Meta:
@@ -0,0 +1,97 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+from .cache import invalidate_catalog
+from .models import Category, Product, Review
+from .search import get_search_backend
+
+
+def apply_rating_delta(product_id, rating_delta, count_delta):
+    """Adjust a product's stored rating totals with a single UPDATE"""
+    Product.objects.filter(pk=product_id).update(
+        rating_sum=F('rating_sum') + rating_delta,
+        rating_count=F('rating_count') + count_delta,
+        updated_at=timezone.now(),
+    )
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    instance._previous_rating = None
+    if instance.pk:
+        instance._previous_rating = (
+            Review.objects.filter(pk=instance.pk)
+            .values_list('product_id', 'rating')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if created or previous is None:
+        apply_rating_delta(instance.product_id, instance.rating, 1)
+        return
+
+    previous_product_id, previous_rating = previous
+    if previous_product_id != instance.product_id:
+        apply_rating_delta(previous_product_id, -previous_rating, -1)
+        apply_rating_delta(instance.product_id, instance.rating, 1)
+    elif previous_rating != instance.rating:
+        apply_rating_delta(instance.product_id, instance.rating - previous_rating, 0)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_delta(instance.product_id, -instance.rating, -1)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, **kwargs):
+    get_search_backend(using).index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_products([instance.pk])
+
+
+# Versions are bumped once the write commits. Bumped earlier, a concurrent
+# reader could miss the cache, read the old rows and store them under the
+# new version
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, using, **kwargs):
+    transaction.on_commit(lambda: invalidate_catalog('category'), using=using)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_cache(sender, using, **kwargs):
+    transaction.on_commit(lambda: invalidate_catalog('product'), using=using)
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_cache(sender, using, **kwargs):
+    # Reviews also move the product's stored rating totals
+    transaction.on_commit(lambda: invalidate_catalog('review', 'product'), using=using)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    # Covers logout and token rotation
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Cached users must not outlive a deactivation or permission change
+    if not created:
+        for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+            invalidate_token(key)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import F, Func, IntegerField, OuterRef, Subquery
+
+from .models import Cart, Category, Order, Product, Wishlist
+
+CATALOG_COUNTS_KEY = 'dashboard:catalog-counts'
+
+
+def count_of(queryset):
+    """Scalar subquery with the number of rows in ``queryset``"""
+    # A plain COUNT() function, so the subquery is not grouped by anything
+    counted = queryset.order_by().annotate(n=Func(F('pk'), function='COUNT')).values('n')
+    return Subquery(counted, output_field=IntegerField())
+
+
+def catalog_counts_ttl():
+    return getattr(settings, 'DASHBOARD_STATS_TTL', 60)
+
+
+def compute_catalog_counts():
+    return {
+        'total_products': Product.objects.filter(is_active=True).count(),
+        'total_categories': Category.objects.count(),
+    }
+
+
+def catalog_counts():
+    """Site-wide counts from a snapshot refreshed every DASHBOARD_STATS_TTL seconds"""
+    counts = cache.get(CATALOG_COUNTS_KEY)
+    if counts is None:
+        counts = compute_catalog_counts()
+        cache.set(CATALOG_COUNTS_KEY, counts, catalog_counts_ttl())
+    return counts
+
+
+async def acatalog_counts():
+    counts = await cache.aget(CATALOG_COUNTS_KEY)
+    if counts is None:
+        counts = {
+            'total_products': await Product.objects.filter(is_active=True).acount(),
+            'total_categories': await Category.objects.acount(),
+        }
+        await cache.aset(CATALOG_COUNTS_KEY, counts, catalog_counts_ttl())
+    return counts
+
+
+def user_counts_queryset(user):
+    """The user's cart, wishlist and order counts as one row, in one query"""
+    return User.objects.filter(pk=user.pk).values(
+        cart_items=count_of(Cart.objects.filter(user=OuterRef('pk'))),
+        wishlist_items=count_of(Wishlist.objects.filter(user=OuterRef('pk'))),
+        total_orders=count_of(Order.objects.filter(user=OuterRef('pk'))),
+    )
+
+
+def user_counts(user):
+    return user_counts_queryset(user).get()
+
+
+async def auser_counts(user):
+    return await user_counts_queryset(user).aget()
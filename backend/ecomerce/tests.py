@@ -1,3 +1,1598 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import tempfile
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import async_views, urls, views
+from .budgets import QueryBudgetExceeded, budget_for
+from .models import Cart, Category, IdempotencyKey, Order, OrderItem, Product, Profile, Review, StockReservation, Wishlist
+from .authentication import CachedTokenAuthentication, local_tokens, token_cache_key
+from .cache import RECENT_CHANGE_KEY, cache_stats, invalidate_catalog, reset_cache_stats
+from .metrics import render_metrics, reset_metrics
+from .pagination import KeysetPagination
+from .replicas import ReplicaRouter, is_pinned, replica_reads
+
+
+# Tests run against a cache every process could share, as with REDIS_URL set
+# in production; a file-based cache is the one that needs no server
+shared_cache_dir = tempfile.TemporaryDirectory()
+SHARED_CACHES = {'default': {
+    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': shared_cache_dir.name,
+}}
+
+
+# TestCase data is never committed, so a replica connection could not see it
+@override_settings(READ_REPLICA=None, QUERY_BUDGET_MODE='raise', CACHES=SHARED_CACHES)
+class BaseTestCase(TestCase):
+    """Start every test with an empty cache so cached responses never leak"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        local_tokens.clear()
+
+
+def make_catalog(num_products, reviews_per_product=0, category=None):
+    """Create products (and reviews from fresh users) for query-count tests"""
+    if category is None:
+        category, _ = Category.objects.get_or_create(name='Snacks')
+    products = []
+    for i in range(num_products):
+        product = Product.objects.create(
+            name=f'Product {Product.objects.count()}',
+            description='A tasty snack',
+            price=Decimal('2.50'),
+            stock=10,
+            category=category,
+        )
+        for _ in range(reviews_per_product):
+            user = User.objects.create_user(username=f'reviewer{User.objects.count()}')
+            Review.objects.create(user=user, product=product, rating=4)
+        products.append(product)
+    return products
+
+
+@override_settings(CATALOG_CACHE_TTL=0)
+class ProductQueryCountTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_product_list_query_count_is_flat(self):
+        make_catalog(2, reviews_per_product=1)
+        small = self.count_queries(reverse('product-list'))
+
+        make_catalog(15, reviews_per_product=3, category=Category.objects.create(name='Drinks'))
+        large = self.count_queries(reverse('product-list'))
+
+        self.assertEqual(small, large)
+
+    def test_product_detail_query_count_is_flat(self):
+        quiet, busy = make_catalog(1)[0], make_catalog(1, reviews_per_product=5)[0]
+        self.assertEqual(
+            self.count_queries(reverse('product-detail', args=[quiet.pk])),
+            self.count_queries(reverse('product-detail', args=[busy.pk])),
+        )
+
+    def test_product_list_serves_stored_ratings(self):
+        product = make_catalog(1)[0]
+        for rating in (2, 5):
+            user = User.objects.create_user(username=f'rater{rating}')
+            Review.objects.create(user=user, product=product, rating=rating)
+
+        response = self.client.get(reverse('product-list'))
+        result = response.data['results'][0]
+        self.assertEqual(result['average_rating'], 3.5)
+        self.assertEqual(result['review_count'], 2)
+        self.assertEqual(result['category']['name'], 'Snacks')
+
+
+class RatingAggregateTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(1)[0]
+        self.user = User.objects.create_user(username='student')
+
+    def assertRating(self, rating_sum, rating_count):
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.rating_sum, rating_sum)
+        self.assertEqual(self.product.rating_count, rating_count)
+
+    def test_review_create_view_updates_totals(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.user).key)
+        response = client.post(reverse('review-create'), {'product_id': self.product.pk, 'rating': 4})
+        self.assertEqual(response.status_code, 201)
+        self.assertRating(4, 1)
+        self.assertEqual(self.product.average_rating, 4)
+
+    def test_review_update_and_delete_adjust_totals(self):
+        review = Review.objects.create(user=self.user, product=self.product, rating=2)
+        other = User.objects.create_user(username='other')
+        Review.objects.create(user=other, product=self.product, rating=5)
+        self.assertRating(7, 2)
+
+        review.rating = 4
+        review.save()
+        self.assertRating(9, 2)
+
+        review.delete()
+        self.assertRating(5, 1)
+
+    def test_rebuild_ratings_command(self):
+        Review.objects.create(user=self.user, product=self.product, rating=3)
+        Product.objects.update(rating_sum=0, rating_count=0)
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        self.assertRating(3, 1)
+
+
+def auth_client(user):
+    key = Token.objects.get_or_create(user=user)[0].key
+    # Resolve the token once so every measured request sees a warm auth cache
+    CachedTokenAuthentication().authenticate_credentials(key)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + key)
+    return client
+
+
+class CreateOrderTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='buyer')
+        self.client = auth_client(self.user)
+        self.products = make_catalog(3)
+
+    def test_checkout_is_set_based(self):
+        for product in self.products:
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.post(reverse('order-create'), {'shipping_address': 'Block A'})
+
+        for product in make_catalog(12):
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.post(reverse('order-create'), {'shipping_address': 'Block A'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['items']), 12)
+        inserts = [q for q in large.captured_queries if 'INSERT INTO "ecomerce_orderitem"' in q['sql']]
+        self.assertEqual(len(inserts), 1)
+        writes = [q for q in large.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(len(writes), len([q for q in small.captured_queries
+                                           if q['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]))
+
+    def test_checkout_decrements_stock_and_clears_cart(self):
+        product = self.products[0]
+        Cart.objects.create(user=self.user, product=product, quantity=4)
+
+        response = self.client.post(reverse('order-create'), {'shipping_address': 'Block A'})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total_amount'], '10.00')
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 6)
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_insufficient_stock_rolls_back(self):
+        first, second = self.products[:2]
+        Cart.objects.create(user=self.user, product=first, quantity=1)
+        Cart.objects.create(user=self.user, product=second, quantity=11)
+
+        response = self.client.post(reverse('order-create'), {'shipping_address': 'Block A'})
+
+        self.assertEqual(response.status_code, 400)
+        first.refresh_from_db()
+        self.assertEqual(first.stock, 10)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(user=self.user).count(), 2)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    buyers = 12
+
+    def test_parallel_checkouts_never_oversell(self):
+        product = make_catalog(1)[0]
+        Product.objects.filter(pk=product.pk).update(stock=5)
+        clients = []
+        for i in range(self.buyers):
+            user = User.objects.create_user(username=f'buyer{i}')
+            Cart.objects.create(user=user, product=product, quantity=1)
+            clients.append(auth_client(user))
+
+        def checkout(client):
+            try:
+                return client.post(reverse('order-create'), {'shipping_address': 'Block A'}).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.buyers) as pool:
+            statuses = list(pool.map(checkout, clients))
+
+        product.refresh_from_db()
+        sold = sum(OrderItem.objects.filter(product=product).values_list('quantity', flat=True))
+        self.assertEqual(statuses.count(201), 5)
+        self.assertEqual(sold, 5)
+        self.assertEqual(product.stock, 0)
+
+
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    """Retries of one checkout racing each other on separate connections"""
+    retries = 6
+
+    def test_parallel_retries_place_one_order(self):
+        user = User.objects.create_user(username='impatient')
+        product = make_catalog(1)[0]
+        Cart.objects.create(user=user, product=product, quantity=2)
+        clients = [auth_client(user) for _ in range(self.retries)]
+
+        def checkout(client):
+            try:
+                response = client.post(reverse('order-create'), {'shipping_address': 'Block B'},
+                                       HTTP_IDEMPOTENCY_KEY='checkout-1')
+                return response.status_code, response.data.get('id')
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.retries) as pool:
+            results = list(pool.map(checkout, clients))
+
+        self.assertEqual({status_code for status_code, _ in results}, {201})
+        self.assertEqual(len({order_id for _, order_id in results}), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class ConcurrentCartTests(TransactionTestCase):
+    """Parallel adds to one cart line, run against SQLite in WAL mode"""
+    threads = 8
+    adds_per_thread = 5
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.journal_mode = cursor.fetchone()[0]
+            cursor.execute('PRAGMA journal_mode=WAL')
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA journal_mode={self.journal_mode}')
+
+    def test_parallel_adds_stop_at_available_stock(self):
+        user = User.objects.create_user(username='hungry')
+        product = make_catalog(1)[0]
+        StockReservation.objects.create(user=User.objects.create_user(username='holder'), product=product,
+                                        quantity=2, expires_at=timezone.now() + timedelta(minutes=5))
+        clients = [auth_client(user) for _ in range(self.threads)]
+
+        def add_repeatedly(client):
+            try:
+                return [
+                    client.post(reverse('cart-add'), {'product_id': product.pk, 'quantity': 1}).status_code
+                    for _ in range(self.adds_per_thread)
+                ]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            statuses = sum(pool.map(add_repeatedly, clients), [])
+
+        # Ten in stock, two of them held for someone else: every add is
+        # counted until the line reaches the eight left, and no further
+        self.assertEqual(statuses.count(201), 8)
+        self.assertEqual(statuses.count(400), self.threads * self.adds_per_thread - 8)
+        self.assertEqual(Cart.objects.get(user=user, product=product).quantity, 8)
+
+
+class IdempotencyTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='retrier')
+        self.client = auth_client(self.user)
+        self.product = make_catalog(1)[0]
+
+    def test_create_order_retry_is_replayed(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=3)
+        data = {'shipping_address': 'Block B'}
+
+        first = self.client.post(reverse('order-create'), data, HTTP_IDEMPOTENCY_KEY='abc')
+        # Another process has its own caches; the key lives in the database
+        cache.clear()
+        local_tokens.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            retry = auth_client(self.user).post(reverse('order-create'), data, HTTP_IDEMPOTENCY_KEY='abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+        # A replay writes nothing: its claim fails on the unique index and
+        # the stored response is read back
+        self.assertEqual([q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('UPDATE', 'DELETE'))], [])
+
+    def test_key_reused_for_different_request_is_rejected(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        self.client.post(reverse('order-create'), {'shipping_address': 'Block B'}, HTTP_IDEMPOTENCY_KEY='abc')
+
+        response = self.client.post(reverse('order-create'), {'shipping_address': 'Block C'},
+                                    HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 422)
+
+    def test_failed_request_can_be_retried(self):
+        response = self.client.post(reverse('order-create'), {'shipping_address': 'Block B'},
+                                    HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 400)
+
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        response = self.client.post(reverse('order-create'), {'shipping_address': 'Block B'},
+                                    HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(response.status_code, 201)
+
+    @override_settings(QUERY_BUDGET_MODE=None)
+    def test_expired_key_runs_again(self):
+        # Reusing an expired key also pays for deleting it and a second claim
+        data = {'product_id': self.product.pk, 'quantity': 2}
+        self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='add-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        response = self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='add-1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 4)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_purge_command_deletes_expired_keys(self):
+        data = {'product_id': self.product.pk, 'quantity': 1}
+        self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='old')
+        self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=2))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+    def test_cart_add_retry_does_not_double_quantity(self):
+        data = {'product_id': self.product.pk, 'quantity': 2}
+        for _ in range(3):
+            response = self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='add-1')
+            self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(Cart.objects.get(user=self.user).quantity, 2)
+
+    def test_keys_are_scoped_per_user(self):
+        other = User.objects.create_user(username='neighbour')
+        data = {'product_id': self.product.pk, 'quantity': 1}
+        self.client.post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='same')
+        auth_client(other).post(reverse('cart-add'), data, HTTP_IDEMPOTENCY_KEY='same')
+
+        self.assertEqual(Cart.objects.count(), 2)
+
+
+class KeysetPaginationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(KeysetPagination, 'page_size', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.products = make_catalog(10)
+        # Give several products the same timestamp so the id tie-breaker matters
+        same_moment = timezone.now()
+        Product.objects.filter(pk__in=[p.pk for p in self.products[3:7]]).update(created_at=same_moment)
+        self.expected = list(
+            Product.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+
+    def walk(self, url, link):
+        ids, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append(ctx.captured_queries)
+            ids.append([item['id'] for item in response.data['results']])
+            url = response.data[link]
+        return ids, pages
+
+    def test_forward_and_backward_walk(self):
+        forward, pages = self.walk(reverse('product-list') + '?pagination=cursor', 'next')
+        self.assertEqual(sum(forward, []), self.expected)
+        for queries in pages:
+            self.assertEqual(len(queries), 1)
+            self.assertNotIn('COUNT(', queries[0]['sql'])
+
+        last_page = self.client.get(reverse('product-list') + '?pagination=cursor').data
+        while last_page['next']:
+            last_page = self.client.get(last_page['next']).data
+        backward, _ = self.walk(last_page['previous'], 'previous')
+        self.assertEqual(sum(reversed(backward), []) + [p['id'] for p in last_page['results']],
+                         self.expected)
+
+    def test_page_number_mode_is_unchanged(self):
+        response = self.client.get(reverse('product-list'))
+        self.assertEqual(response.data['count'], 10)
+        self.assertEqual(len(response.data['results']), 4)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('product-list') + '?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_review_and_order_lists_support_cursor(self):
+        user = User.objects.create_user(username='pager')
+        for product in self.products[:6]:
+            Review.objects.create(user=User.objects.create_user(username=f'r{product.pk}'),
+                                  product=self.products[0], rating=3)
+            Order.objects.create(user=user, shipping_address='Block A')
+
+        reviews, _ = self.walk(reverse('review-list', args=[self.products[0].pk]) + '?pagination=cursor', 'next')
+        self.assertEqual([len(page) for page in reviews], [4, 2])
+
+        client = auth_client(user)
+        response = client.get(reverse('order-list') + '?pagination=cursor')
+        self.assertEqual(len(response.data['results']), 4)
+        response = client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNone(response.data['next'])
+
+
+class ProductSearchTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        category = Category.objects.create(name='Snacks')
+        self.chips = Product.objects.create(name='Salted Potato Chips', description='Crunchy',
+                                            price=Decimal('2.00'), category=category)
+        self.dip = Product.objects.create(name='Cheese Dip', description='Great with potato chips',
+                                          price=Decimal('3.00'), category=category)
+        self.cola = Product.objects.create(name='Cola', description='Fizzy drink',
+                                           price=Decimal('1.00'), category=category)
+
+    def search(self, text):
+        response = self.client.get(reverse('product-list'), {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.search('chips'), [self.chips.pk, self.dip.pk])
+
+    def test_prefix_match_for_type_ahead(self):
+        self.assertEqual(self.search('pota'), [self.chips.pk, self.dip.pk])
+        self.assertEqual(self.search('fiz'), [self.cola.pk])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('cheese chip'), [self.dip.pk])
+        self.assertEqual(self.search('cola chips'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.cola.name = 'Ginger Beer'
+        self.cola.save()
+        self.assertEqual(self.search('cola'), [])
+        self.assertEqual(self.search('ginger'), [self.cola.pk])
+
+        self.chips.delete()
+        self.assertEqual(self.search('chips'), [self.dip.pk])
+
+    def test_punctuation_is_ignored(self):
+        self.assertEqual(self.search('"chips*'), [self.chips.pk, self.dip.pk])
+        self.assertEqual(len(self.search('!!')), 3)
+
+    def test_cursor_pagination_is_refused_with_search(self):
+        # Keyset order would replace the relevance ranking
+        for params in ({'pagination': 'cursor'}, {'cursor': 'anything'}):
+            response = self.client.get(reverse('product-list'), {'search': 'chips', **params})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('pagination', response.data)
+
+    @override_settings(PRODUCT_SEARCH_BACKEND='ecomerce.search.ScanSearchBackend')
+    def test_scan_backend_fallback(self):
+        self.assertEqual(sorted(self.search('chips')), sorted([self.chips.pk, self.dip.pk]))
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@override_settings(CATALOG_CACHE_TTL=0)
+class QueryPlanTests(BaseTestCase):
+    """Every query a hot view runs must be served by an index.
+
+    The plan of each captured statement is checked for full table scans
+    (``SCAN <table>`` without an index) and for sorts that could not use an
+    index (``USE TEMP B-TREE FOR ORDER BY``).
+    """
+    # Tables that are small and listed in full by design
+    full_scan_allowed = {'ecomerce_category'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='planner')
+        cls.products = make_catalog(3, reviews_per_product=1)
+        cls.product = cls.products[0]
+        Cart.objects.create(user=cls.user, product=cls.product, quantity=1)
+        Wishlist.objects.create(user=cls.user, product=cls.product)
+        cls.order = Order.objects.create(user=cls.user, shipping_address='Block A')
+        OrderItem.objects.create(order=cls.order, product=cls.product, quantity=1, price=cls.product.price)
+
+    def setUp(self):
+        super().setUp()
+        self.client = auth_client(self.user)
+
+    def plan_problems(self, sql):
+        problems = []
+        for detail in explain(sql):
+            if detail.startswith('SCAN ') and ' USING ' not in detail and 'VIRTUAL TABLE' not in detail:
+                table = detail.split()[1]
+                if table not in self.full_scan_allowed:
+                    problems.append(detail)
+            if 'TEMP B-TREE FOR ORDER BY' in detail:
+                problems.append(detail)
+        return problems
+
+    def assertIndexedQueries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        for query in ctx.captured_queries:
+            if not query['sql'].startswith('SELECT'):
+                continue
+            problems = self.plan_problems(query['sql'])
+            self.assertFalse(problems, f"{url}: {problems}\n{query['sql']}")
+
+    def test_product_list(self):
+        self.assertIndexedQueries(reverse('product-list'))
+        self.assertIndexedQueries(reverse('product-list'), {'category': self.product.category_id})
+        self.assertIndexedQueries(reverse('product-list'), {'pagination': 'cursor'})
+
+    @mock.patch.object(KeysetPagination, 'page_size', 1)
+    def test_product_list_cursor_page(self):
+        next_url = self.client.get(reverse('product-list'), {'pagination': 'cursor'}).data['next']
+        self.assertIndexedQueries(next_url)
+
+    def test_product_detail(self):
+        self.assertIndexedQueries(reverse('product-detail', args=[self.product.pk]))
+
+    def test_category_routes(self):
+        self.assertIndexedQueries(reverse('category-list'))
+        self.assertIndexedQueries(reverse('category-detail', args=[self.product.category_id]))
+
+    def test_review_list(self):
+        self.assertIndexedQueries(reverse('review-list', args=[self.product.pk]))
+
+    def test_order_routes(self):
+        self.assertIndexedQueries(reverse('order-list'))
+        self.assertIndexedQueries(reverse('order-list'), {'summary': 1})
+        self.assertIndexedQueries(reverse('order-detail', args=[self.order.pk]))
+
+    def test_cart_and_wishlist(self):
+        self.assertIndexedQueries(reverse('cart-list'))
+        self.assertIndexedQueries(reverse('wishlist-list'))
+
+    def test_harness_flags_scans_and_sorts(self):
+        problems = self.plan_problems('SELECT * FROM ecomerce_product WHERE name = 1 ORDER BY price')
+        self.assertEqual(problems, ['SCAN ecomerce_product', 'USE TEMP B-TREE FOR ORDER BY'])
+
+    def test_dashboard_stats(self):
+        self.assertIndexedQueries(reverse('dashboard-stats'))
+
+
+class CatalogCacheTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_cache_stats()
+        self.client = APIClient()
+        self.product = make_catalog(1)[0]
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        return response, response['X-Cache']
+
+    def test_repeat_request_is_served_from_cache(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        self.assertEqual(self.get(url)[1], 'MISS')
+        with CaptureQueriesContext(connection) as ctx:
+            response, outcome = self.get(url)
+        self.assertEqual(outcome, 'HIT')
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.data['name'], self.product.name)
+        self.assertEqual(cache_stats()['ProductDetailView'], {'hits': 1, 'misses': 1})
+
+    def test_query_params_are_normalized(self):
+        url = reverse('product-list')
+        category = self.product.category_id
+        self.get(f'{url}?category={category}&search=product')
+        self.assertEqual(self.get(f'{url}?search=product&category={category}')[1], 'HIT')
+        self.assertEqual(self.get(f'{url}?search=other')[1], 'MISS')
+
+    def test_product_change_invalidates(self):
+        url = reverse('product-list')
+        self.get(url)
+        self.product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        response, outcome = self.get(url)
+        self.assertEqual(outcome, 'MISS')
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed')
+
+    def test_category_change_invalidates_nested_products(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        self.get(url)
+        category = self.product.category
+        category.name = 'Crisps'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        self.assertEqual(self.get(url)[0].data['category']['name'], 'Crisps')
+
+    def test_review_invalidates_reviews_and_ratings(self):
+        self.get(reverse('product-detail', args=[self.product.pk]))
+        self.get(reverse('review-list', args=[self.product.pk]))
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(user=User.objects.create_user(username='critic'), product=self.product, rating=5)
+
+        self.assertEqual(self.get(reverse('product-detail', args=[self.product.pk]))[0].data['review_count'], 1)
+        self.assertEqual(self.get(reverse('review-list', args=[self.product.pk]))[0].data['count'], 1)
+
+    def test_invalidation_waits_for_the_commit(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        self.get(url)
+        self.product.name = 'Renamed'
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.product.save()
+            # Until the write commits, readers keep the version they had
+            self.assertEqual(self.get(url)[1], 'HIT')
+        self.assertEqual(len(callbacks), 1)
+
+    def test_checkout_invalidates_stock(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        self.get(url)
+        user = User.objects.create_user(username='hungry')
+        Cart.objects.create(user=user, product=self.product, quantity=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            auth_client(user).post(reverse('order-create'), {'shipping_address': 'Block A'})
+        self.assertEqual(self.get(url)[0].data['stock'], 7)
+
+    def test_missing_objects_are_not_cached(self):
+        url = reverse('product-detail', args=[self.product.pk + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(cache_stats()['ProductDetailView'], {'hits': 0, 'misses': 2})
+
+    def test_stats_endpoint_is_admin_only(self):
+        self.get(reverse('category-list'))
+        self.assertEqual(self.client.get(reverse('cache-stats')).status_code, 401)
+
+        admin = User.objects.create_superuser(username='admin', password='pw')
+        response = auth_client(admin).get(reverse('cache-stats'))
+        self.assertEqual(response.data['CategoryListView'], {'hits': 0, 'misses': 1})
+
+
+class ConditionalGetTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='poller')
+        self.client = auth_client(self.user)
+        self.product = make_catalog(1)[0]
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_product_list_returns_304(self):
+        url = reverse('product-list') + '?pagination=cursor'
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+
+        with self.settings(CATALOG_CACHE_TTL=0), CaptureQueriesContext(connection) as ctx:
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second.content, b'')
+        # Only the page itself; nothing is serialized
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_cached_response_revalidates_without_queries(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        first = APIClient().get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            second = APIClient().get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_if_modified_since(self):
+        url = reverse('category-detail', args=[self.product.category_id])
+        first = self.client.get(url)
+        second = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(second.status_code, 304)
+
+    def test_changes_produce_a_new_etag(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        first = self.client.get(url)
+
+        category = self.product.category
+        category.description = 'Now with more crunch'
+        with self.captureOnCommitCallbacks(execute=True):
+            category.save()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_rating_rebuild_produces_a_new_etag(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        Review.objects.create(user=self.user, product=self.product, rating=2)
+        # Stored totals drifted without touching updated_at
+        Product.objects.filter(pk=self.product.pk).update(rating_sum=0, rating_count=0)
+        first = self.client.get(url)
+
+        call_command('rebuild_ratings', stdout=StringIO())
+        second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data['average_rating'], 2)
+
+    def test_deletion_changes_list_etag(self):
+        url = reverse('product-list')
+        other = make_catalog(1)[0]
+        first = self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertEqual(self.revalidate(url, first).status_code, 200)
+
+    def test_list_ignores_if_modified_since_after_a_deletion(self):
+        other = make_catalog(1)[0]
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        Cart.objects.create(user=self.user, product=other, quantity=1)
+        url = reverse('cart-list')
+        self.client.get(url)
+        Cart.objects.filter(user=self.user, product=other).delete()
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date((timezone.now() + timedelta(minutes=1)).timestamp()))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 1)
+
+    def test_private_lists(self):
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        Wishlist.objects.create(user=self.user, product=self.product)
+        order = Order.objects.create(user=self.user, shipping_address='Block A')
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=self.product.price)
+
+        for url in (reverse('cart-list'), reverse('wishlist-list'), reverse('order-list'),
+                    reverse('order-detail', args=[order.pk])):
+            first = self.client.get(url)
+            self.assertEqual(self.revalidate(url, first).status_code, 304, url)
+
+        first = self.client.get(reverse('cart-list'))
+        Cart.objects.filter(user=self.user).update(quantity=2, updated_at=timezone.now())
+        self.assertEqual(self.revalidate(reverse('cart-list'), first).status_code, 200)
+
+    def test_missing_object_is_still_404(self):
+        url = reverse('product-detail', args=[self.product.pk + 100])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"anything"').status_code, 404)
+
+
+class EmbeddedProductTests(BaseTestCase):
+    compact_fields = {'id', 'name', 'price', 'image', 'is_in_stock'}
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='snacker')
+        self.client = auth_client(self.user)
+        self.product = make_catalog(1)[0]
+        Cart.objects.create(user=self.user, product=self.product, quantity=1)
+        Wishlist.objects.create(user=self.user, product=self.product)
+        Review.objects.create(user=self.user, product=self.product, rating=5)
+        order = Order.objects.create(user=self.user, shipping_address='Block A')
+        OrderItem.objects.create(order=order, product=self.product, quantity=1, price=self.product.price)
+
+    def embedded_products(self, params=None):
+        products = []
+        for url in (reverse('cart-list'), reverse('wishlist-list'),
+                    reverse('review-list', args=[self.product.pk])):
+            products.append(self.client.get(url, params).data['results'][0]['product'])
+        products.append(self.client.get(reverse('order-list'), params).data['results'][0]['items'][0]['product'])
+        return products
+
+    def test_embedded_products_are_compact(self):
+        for product in self.embedded_products():
+            self.assertEqual(set(product), self.compact_fields)
+
+    def test_expand_product_embeds_full_object(self):
+        for product in self.embedded_products({'expand': 'product'}):
+            self.assertEqual(product['category']['name'], 'Snacks')
+            self.assertIn('description', product)
+
+    def test_create_order_honours_expand(self):
+        response = self.client.post(reverse('order-create') + '?expand=product', {'shipping_address': 'Block A'})
+        self.assertIn('average_rating', response.data['items'][0]['product'])
+
+
+class CartSummaryTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='summariser')
+        self.client = auth_client(self.user)
+
+    def test_totals_and_warnings_come_from_one_query(self):
+        chips, cola, gum = make_catalog(3)
+        Product.objects.filter(pk=cola.pk).update(price=Decimal('1.15'), stock=2)
+        Product.objects.filter(pk=gum.pk).update(is_active=False)
+        Cart.objects.create(user=self.user, product=chips, quantity=3)
+        Cart.objects.create(user=self.user, product=cola, quantity=5)
+        Cart.objects.create(user=self.user, product=gum, quantity=1)
+        Cart.objects.create(user=User.objects.create_user(username='other'), product=chips, quantity=9)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('cart-summary'))
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['subtotal'], '15.75')
+        self.assertEqual(response.data['item_count'], 9)
+        self.assertEqual(response.data['line_count'], 3)
+        self.assertEqual([item['product']['id'] for item in response.data['items']],
+                         [chips.pk, cola.pk, gum.pk])
+        self.assertEqual(response.data['stock_warnings'], [
+            {'cart_item_id': response.data['items'][1]['id'], 'product_id': cola.pk,
+             'requested': 5, 'available': 2, 'shortfall': 3},
+            {'cart_item_id': response.data['items'][2]['id'], 'product_id': gum.pk,
+             'requested': 1, 'available': 0, 'shortfall': 1},
+        ])
+
+    def test_other_users_holds_count_against_stock(self):
+        chips = make_catalog(1)[0]
+        Product.objects.filter(pk=chips.pk).update(stock=5)
+        other = User.objects.create_user(username='holder')
+        StockReservation.objects.create(user=other, product=chips, quantity=3,
+                                        expires_at=timezone.now() + timedelta(minutes=5))
+        StockReservation.objects.create(user=User.objects.create_user(username='lapsed'), product=chips,
+                                        quantity=9, expires_at=timezone.now() - timedelta(seconds=1))
+        # The user's own hold is stock they are entitled to
+        StockReservation.objects.create(user=self.user, product=chips, quantity=2,
+                                        expires_at=timezone.now() + timedelta(minutes=5))
+        line = Cart.objects.create(user=self.user, product=chips, quantity=4)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('cart-summary'))
+
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.data['stock_warnings'], [
+            {'cart_item_id': line.pk, 'product_id': chips.pk,
+             'requested': 4, 'available': 2, 'shortfall': 2},
+        ])
+
+    def test_empty_cart(self):
+        response = self.client.get(reverse('cart-summary'))
+        self.assertEqual(response.data['subtotal'], '0.00')
+        self.assertEqual(response.data['item_count'], 0)
+        self.assertEqual(response.data['stock_warnings'], [])
+
+    def test_cart_list_query_count_is_flat(self):
+        for product in make_catalog(2):
+            Cart.objects.create(user=self.user, product=product, quantity=1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('cart-list'))
+        for product in make_catalog(10):
+            Cart.objects.create(user=self.user, product=product, quantity=1)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(reverse('cart-list'), {'expand': 'product'})
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class BulkCartTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='syncer')
+        self.client = auth_client(self.user)
+        self.products = make_catalog(4)
+
+    def bulk(self, items):
+        return self.client.post(reverse('cart-bulk'), {'items': items}, format='json')
+
+    def quantities(self):
+        return dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_add_set_and_remove_in_one_request(self):
+        first, second, third, fourth = self.products
+        Cart.objects.create(user=self.user, product=first, quantity=2)
+        Cart.objects.create(user=self.user, product=second, quantity=2)
+        Cart.objects.create(user=self.user, product=third, quantity=2)
+
+        response = self.bulk([
+            {'product_id': first.pk, 'quantity': 3},
+            {'product_id': second.pk, 'quantity': 5, 'action': 'set'},
+            {'product_id': third.pk, 'action': 'remove'},
+            {'product_id': fourth.pk, 'quantity': 1},
+            {'product_id': fourth.pk, 'quantity': 2},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {first.pk: 5, second.pk: 5, fourth.pk: 3})
+        self.assertEqual(len(response.data), 3)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.bulk([{'product_id': p.pk} for p in self.products[:2]])
+        Cart.objects.all().delete()
+        more = self.products + make_catalog(16)
+        with CaptureQueriesContext(connection) as large:
+            response = self.bulk([{'product_id': p.pk} for p in more])
+        self.assertEqual(len(response.data), 20)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_invalid_batch_changes_nothing(self):
+        first, second = self.products[:2]
+        Product.objects.filter(pk=second.pk).update(is_active=False)
+        response = self.bulk([
+            {'product_id': first.pk, 'quantity': 1},
+            {'product_id': second.pk, 'quantity': 1},
+            {'product_id': 9999, 'quantity': 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data['items']), {1, 2})
+
+        response = self.bulk([
+            {'product_id': first.pk, 'quantity': 6},
+            {'product_id': first.pk, 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][1], ['Only 10 items in stock'])
+        self.assertEqual(self.quantities(), {})
+
+    def test_empty_batch_is_rejected(self):
+        self.assertEqual(self.bulk([]).status_code, 400)
+
+
+class ReorderTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='regular')
+        self.client = auth_client(self.user)
+        self.products = make_catalog(3)
+        self.order = self.make_order(self.products, quantity=2)
+
+    def make_order(self, products, quantity):
+        order = Order.objects.create(user=self.user, shipping_address='Block A')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+            for product in products
+        ])
+        return order
+
+    def reorder(self, order):
+        return self.client.post(reverse('order-reorder', args=[order.pk]))
+
+    def test_reorder_merges_and_clamps(self):
+        chips, cola, gum = self.products
+        Cart.objects.create(user=self.user, product=chips, quantity=1)
+        Product.objects.filter(pk=cola.pk).update(stock=1)
+        Product.objects.filter(pk=gum.pk).update(is_active=False)
+
+        response = self.reorder(self.order)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(dict(Cart.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+                         {chips.pk: 3, cola.pk: 1})
+        self.assertEqual(response.data['adjustments'], [
+            {'product_id': cola.pk, 'requested': 2, 'added': 1, 'reason': 'limited_stock'},
+            {'product_id': gum.pk, 'requested': 2, 'added': 0, 'reason': 'out_of_stock'},
+        ])
+
+    def test_reorder_is_one_round_trip_regardless_of_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.reorder(self.order)
+        Cart.objects.all().delete()
+        large_order = self.make_order(make_catalog(20), quantity=1)
+        with CaptureQueriesContext(connection) as large:
+            response = self.reorder(large_order)
+        self.assertEqual(len(response.data['items']), 20)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_cannot_reorder_someone_elses_order(self):
+        other = User.objects.create_user(username='stranger')
+        self.assertEqual(auth_client(other).post(reverse('order-reorder', args=[self.order.pk])).status_code, 404)
+
+
+class OrderHistoryTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='regular')
+        self.client = auth_client(self.user)
+        self.products = make_catalog(4)
+
+    def make_orders(self, count, items_per_order):
+        for _ in range(count):
+            order = Order.objects.create(user=self.user, shipping_address='Block A', total_amount=5)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=2, price=product.price)
+                for product in self.products[:items_per_order]
+            ])
+
+    def count_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_order_list_query_count_is_flat(self):
+        self.make_orders(1, items_per_order=1)
+        baseline = self.count_queries(reverse('order-list'))
+        baseline_expanded = self.count_queries(reverse('order-list'), {'expand': 'product'})
+        self.make_orders(10, items_per_order=4)
+        self.assertEqual(self.count_queries(reverse('order-list')), baseline)
+        self.assertEqual(self.count_queries(reverse('order-list'), {'expand': 'product'}), baseline_expanded)
+
+    def test_order_detail_query_count_is_flat(self):
+        self.make_orders(2, items_per_order=1)
+        small, large = Order.objects.order_by('id')
+        OrderItem.objects.bulk_create([
+            OrderItem(order=large, product=product, quantity=1, price=product.price)
+            for product in self.products[1:]
+        ])
+        self.assertEqual(
+            self.count_queries(reverse('order-detail', args=[small.pk])),
+            self.count_queries(reverse('order-detail', args=[large.pk])),
+        )
+
+    def test_summary_mode(self):
+        self.make_orders(2, items_per_order=3)
+        Order.objects.create(user=self.user, shipping_address='Block A')
+
+        response = self.client.get(reverse('order-list'), {'summary': 1})
+
+        results = response.data['results']
+        self.assertEqual(len(results), 3)
+        self.assertNotIn('items', results[0])
+        self.assertEqual([(r['item_count'], r['item_quantity']) for r in results], [(0, 0), (3, 6), (3, 6)])
+        self.assertEqual(results[1]['total_amount'], '5.00')
+
+
+class StockReservationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = make_catalog(1)[0]
+        Product.objects.filter(pk=self.product.pk).update(stock=3)
+        self.buyer = User.objects.create_user(username='buyer')
+        self.rival = User.objects.create_user(username='rival')
+        self.buyer_client = auth_client(self.buyer)
+        self.rival_client = auth_client(self.rival)
+
+    def reserve(self, client):
+        return client.post(reverse('checkout-reserve'))
+
+    def test_reservation_holds_stock_from_other_users(self):
+        Cart.objects.create(user=self.buyer, product=self.product, quantity=2)
+        response = self.reserve(self.buyer_client)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['items'], [{'product_id': self.product.pk, 'quantity': 2}])
+
+        # Only one unit is left to promise to anyone else
+        response = self.rival_client.post(reverse('cart-add'), {'product_id': self.product.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Only 1 items in stock', str(response.data))
+
+        Cart.objects.create(user=self.rival, product=self.product, quantity=2)
+        self.assertEqual(self.reserve(self.rival_client).status_code, 409)
+        response = self.rival_client.post(reverse('order-create'), {'shipping_address': 'Block B'})
+        self.assertEqual(response.status_code, 400)
+
+        # The holder checks out and the hold is released
+        response = self.buyer_client.post(reverse('order-create'), {'shipping_address': 'Block A'})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_adding_to_a_line_stops_at_stock_left_by_other_holds(self):
+        StockReservation.objects.create(user=self.rival, product=self.product, quantity=1,
+                                        expires_at=timezone.now() + timedelta(minutes=5))
+        Cart.objects.create(user=self.buyer, product=self.product, quantity=2)
+
+        response = self.buyer_client.post(reverse('cart-add'), {'product_id': self.product.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Cart.objects.get(user=self.buyer).quantity, 2)
+
+    def test_expired_reservations_are_ignored_and_swept(self):
+        StockReservation.objects.create(
+            user=self.buyer, product=self.product, quantity=3,
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        response = self.rival_client.post(reverse('cart-add'), {'product_id': self.product.pk, 'quantity': 3})
+        self.assertEqual(response.status_code, 201)
+
+        out = StringIO()
+        call_command('release_expired_reservations', stdout=out)
+        self.assertIn('Released 1 expired reservations', out.getvalue())
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_reserving_again_replaces_holds(self):
+        other = make_catalog(1)[0]
+        Cart.objects.create(user=self.buyer, product=self.product, quantity=1)
+        Cart.objects.create(user=self.buyer, product=other, quantity=1)
+        self.reserve(self.buyer_client)
+        Cart.objects.filter(user=self.buyer, product=other).delete()
+        Cart.objects.filter(user=self.buyer).update(quantity=3)
+
+        self.assertEqual(self.reserve(self.buyer_client).status_code, 200)
+        self.assertEqual(
+            list(StockReservation.objects.values_list('product_id', 'quantity')), [(self.product.pk, 3)]
+        )
+        self.assertEqual(self.buyer_client.delete(reverse('checkout-reserve')).status_code, 204)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class CartUpdateTests(BaseTestCase):
+    def test_update_writes_only_submitted_columns(self):
+        user = User.objects.create_user(username='regular')
+        product = make_catalog(1)[0]
+        item = Cart.objects.create(user=user, product=product, quantity=1)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = auth_client(user).patch(
+                reverse('cart-update', args=[item.pk]), {'product_id': product.pk, 'quantity': 4}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['quantity'], 4)
+        update = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE')]
+        self.assertEqual(len(update), 1)
+        self.assertNotIn('"created_at"', update[0])
+
+
+@override_settings(READ_REPLICA='replica', CATALOG_CACHE_TTL=0)
+class ReplicaRouterTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.router = ReplicaRouter()
+        self.user = User.objects.create_user(username='regular')
+        self.product = make_catalog(1)[0]
+
+    def test_only_catalog_reads_in_scope_go_to_the_replica(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_read(Review), 'replica')
+            self.assertIsNone(self.router.db_for_read(Cart))
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'ecomerce'))
+
+    def catalog_reads(self, client):
+        """Which Product reads the router was asked to put on the replica"""
+        routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            if model is Product:
+                routed.append(db_for_read(router, model, **hints) == 'replica')
+            return None
+
+        with mock.patch.object(ReplicaRouter, 'db_for_read', autospec=True, side_effect=record):
+            self.assertEqual(client.get(reverse('product-list')).status_code, 200)
+        return routed
+
+    def test_writers_are_pinned_to_the_primary(self):
+        client = auth_client(self.user)
+        self.assertTrue(self.catalog_reads(client))
+        self.assertTrue(all(self.catalog_reads(client)))
+
+        response = client.post(reverse('cart-add'), {'product_id': self.product.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(is_pinned(self.user))
+        self.assertFalse(any(self.catalog_reads(client)))
+
+    @override_settings(CATALOG_CACHE_TTL=300)
+    def test_replica_reads_right_after_a_change_are_not_cached(self):
+        url = reverse('product-detail', args=[self.product.pk])
+        client = APIClient()
+        # The test database stands in for the replica
+        with mock.patch.object(ReplicaRouter, 'db_for_read', return_value=None):
+            invalidate_catalog('product')
+            self.assertEqual(client.get(url)['X-Cache'], 'MISS')
+            self.assertEqual(client.get(url)['X-Cache'], 'MISS')
+
+            cache.delete(RECENT_CHANGE_KEY.format('product'))
+            self.assertEqual(client.get(url)['X-Cache'], 'MISS')
+            self.assertEqual(client.get(url)['X-Cache'], 'HIT')
+
+    def test_failed_writes_do_not_pin(self):
+        client = auth_client(self.user)
+        response = client.post(reverse('cart-add'), {'product_id': self.product.pk + 100, 'quantity': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(is_pinned(self.user))
+
+
+@unittest.skipUnless('replica' in settings.DATABASES, 'set SQLITE_REPLICA_PATH to run against a replica')
+class ReplicaDatabaseTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_catalog_reads_hit_the_replica(self):
+        product = make_catalog(1)[0]
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connection) as primary:
+            response = APIClient().get(reverse('product-detail', args=[product.pk]))
+        self.assertEqual(response.data['name'], product.name)
+        self.assertTrue(replica.captured_queries)
+        self.assertFalse(primary.captured_queries)
+
+
+class AsyncViewTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = make_catalog(3, reviews_per_product=1)
+        self.user = User.objects.create_user(username='regular')
+        self.token = Token.objects.create(user=self.user)
+
+    async def test_product_list_matches_sync_view(self):
+        sync_response = await sync_to_async(APIClient().get)(reverse('product-list'), {'search': 'product'})
+        response = await AsyncClient().get(reverse('async-product-list'), {'search': 'product'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], json.loads(sync_response.content)['results'])
+        self.assertEqual(response.json()['count'], 3)
+
+    async def test_product_detail_and_category_list(self):
+        product = self.products[0]
+        response = await AsyncClient().get(reverse('async-product-detail', args=[product.pk]))
+        self.assertEqual(response.json()['name'], product.name)
+        self.assertEqual(response.json()['category']['name'], 'Snacks')
+        response = await AsyncClient().get(reverse('async-product-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        response = await AsyncClient().get(reverse('async-category-list'))
+        self.assertEqual([c['name'] for c in response.json()['results']], ['Snacks'])
+
+    async def test_dashboard_stats(self):
+        await Cart.objects.acreate(user=self.user, product=self.products[0], quantity=2)
+        anonymous = await AsyncClient().get(reverse('async-dashboard-stats'))
+        self.assertEqual(anonymous.json(), {'total_products': 3, 'total_categories': 1})
+        response = await AsyncClient().get(
+            reverse('async-dashboard-stats'), headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.json()['cart_items'], 1)
+        self.assertEqual(response.json()['total_orders'], 0)
+
+    async def test_invalid_token_is_rejected_like_the_sync_view(self):
+        headers = {'Authorization': 'Token not-a-real-token'}
+        sync_response = await sync_to_async(APIClient().get)(reverse('dashboard-stats'), headers=headers)
+        response = await AsyncClient().get(reverse('async-dashboard-stats'), headers=headers)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.status_code, sync_response.status_code)
+        self.assertEqual(response.json(), json.loads(sync_response.content))
+        self.assertEqual(response['WWW-Authenticate'], sync_response['WWW-Authenticate'])
+
+
+class DashboardStatsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='regular')
+        self.products = make_catalog(2)
+        Cart.objects.create(user=self.user, product=self.products[0], quantity=3)
+        Wishlist.objects.create(user=self.user, product=self.products[1])
+
+    def test_counts(self):
+        response = auth_client(self.user).get(reverse('dashboard-stats'))
+        self.assertEqual(response.data, {
+            'total_products': 2, 'total_categories': 1,
+            'cart_items': 1, 'wishlist_items': 1, 'total_orders': 0,
+        })
+
+    def test_catalog_counts_are_a_snapshot(self):
+        client = APIClient()
+        self.assertEqual(client.get(reverse('dashboard-stats')).data['total_products'], 2)
+        make_catalog(1)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(reverse('dashboard-stats'))
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(response.data['total_products'], 2)
+
+    def test_user_counts_take_one_query(self):
+        client = auth_client(self.user)
+        client.get(reverse('dashboard-stats'))
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(reverse('dashboard-stats'))
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class CachedTokenAuthenticationTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='regular')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_token_lookup_is_cached(self):
+        url = reverse('cart-list')
+        cold = self.count_queries(url)
+        self.assertEqual(self.count_queries(url), cold - 1)
+        # The in-process layer is off by default
+        self.assertIsNone(local_tokens.get(self.token.key))
+
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    @override_settings(TOKEN_AUTH_LOCAL_TTL=5)
+    def test_process_local_layer_is_opt_in(self):
+        self.count_queries(reverse('cart-list'))
+        self.assertEqual(local_tokens.get(self.token.key), self.user)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertIsNone(local_tokens.get(self.token.key))
+
+    @override_settings(TOKEN_AUTH_LOCAL_TTL=5, CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }})
+    def test_tokens_are_not_cached_without_a_shared_cache(self):
+        url = reverse('cart-list')
+        cold = self.count_queries(url)
+        self.assertEqual(self.count_queries(url), cold)
+        self.assertIsNone(cache.get(token_cache_key(self.token.key)))
+        self.assertIsNone(local_tokens.get(self.token.key))
+
+    def test_logout_revokes_immediately(self):
+        self.client.get(reverse('cart-list'))
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(reverse('cart-list')).status_code, 401)
+
+    def test_rotation_revokes_old_token(self):
+        self.client.get(reverse('cart-list'))
+        response = self.client.post(reverse('token-rotate'))
+        self.assertEqual(self.client.get(reverse('cart-list')).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + response.data['token'])
+        self.assertEqual(self.client.get(reverse('cart-list')).status_code, 200)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(reverse('cart-list'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('cart-list')).status_code, 401)
+
+
+class MetricsTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        make_catalog(3)
+        self.admin = User.objects.create_user(username='admin', is_staff=True)
+
+    def test_records_requests_per_url_name(self):
+        client = APIClient()
+        for _ in range(2):
+            client.get(reverse('product-list'))
+        body = auth_client(self.admin).get(reverse('metrics')).content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="product-list",method="GET"} 2', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="product-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('db_queries_per_request_sum{view="product-list",method="GET"}', body)
+        self.assertIn('http_response_size_bytes_total{view="product-list",method="GET"}', body)
+
+    def test_counts_queries_of_each_request(self):
+        with CaptureQueriesContext(connection) as ctx:
+            APIClient().get(reverse('category-list'))
+        body = render_metrics()
+        self.assertIn(
+            f'db_queries_per_request_sum{{view="category-list",method="GET"}} {len(ctx.captured_queries)}', body
+        )
+
+    def test_requires_admin(self):
+        self.assertEqual(auth_client(User.objects.create_user(username='regular')).get(reverse('metrics')).status_code, 403)
+
+    def test_slow_requests_are_logged(self):
+        with override_settings(SLOW_REQUEST_THRESHOLD_MS=0), self.assertLogs('ecomerce.metrics', 'WARNING') as logs:
+            APIClient().get(reverse('category-list'))
+        self.assertIn('Slow request GET /api/categories/ (category-list)', logs.output[0])
+
+    async def test_counts_queries_of_async_views(self):
+        await AsyncClient().get(reverse('async-category-list'))
+        # The count and the page, run in sync_to_async threads
+        self.assertIn('db_queries_per_request_sum{view="async-category-list",method="GET"} 2', render_metrics())
+
+    @override_settings(DEBUG=True)
+    def test_middleware_is_not_adapted_under_asgi(self):
+        # Django logs every sync-only middleware it wraps for an async handler
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_middleware_records_nothing(self):
+        APIClient().get(reverse('product-list'))
+        self.assertNotIn('view="product-list"', render_metrics())
+
+
+class QueryBudgetTests(BaseTestCase):
+    """Drive every route against a realistic catalog and hold it to its query budget.
+
+    Caches are cleared before each request, so budgets cover the cold path:
+    token lookup, catalog cache miss and all.
+    """
+
+    def setUp(self):
+        super().setUp()
+        drinks = Category.objects.create(name='Drinks')
+        self.products = make_catalog(12, reviews_per_product=2) + make_catalog(12, reviews_per_product=2, category=drinks)
+        self.user = User.objects.create_user(username='regular', password='snacks123')
+        self.admin = User.objects.create_user(username='admin', is_staff=True)
+        for product in self.products[:5]:
+            Cart.objects.create(user=self.user, product=product, quantity=2)
+            Wishlist.objects.create(user=self.user, product=product)
+        for i in range(3):
+            order = Order.objects.create(user=self.user, shipping_address='Block A', total_amount=20)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=2, price=product.price)
+                for product in self.products[i * 4:i * 4 + 4]
+            ])
+        self.order = order
+
+    def client_for(self, user):
+        client = APIClient()
+        if user is not None:
+            client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(user=user)[0].key)
+        return client
+
+    def routes(self):
+        product = self.products[0]
+        cart_item = Cart.objects.filter(user=self.user).first()
+        wishlist_item = Wishlist.objects.filter(user=self.user).first()
+        fresh = self.products[10]
+        # (url name, args, method, params/body, user, expected status); run in order
+        return [
+            ('category-list', [], 'get', {}, None, 200),
+            ('category-detail', [product.category_id], 'get', {}, None, 200),
+            ('product-list', [], 'get', {}, None, 200),
+            ('product-list', [], 'get', {'category': product.category_id}, None, 200),
+            ('product-list', [], 'get', {'search': 'product'}, None, 200),
+            ('product-detail', [product.pk], 'get', {}, None, 200),
+            ('review-list', [product.pk], 'get', {}, None, 200),
+            ('dashboard-stats', [], 'get', {}, None, 200),
+            ('async-category-list', [], 'get', {}, None, 200),
+            ('async-product-list', [], 'get', {'search': 'product'}, None, 200),
+            ('async-product-detail', [product.pk], 'get', {}, None, 200),
+            ('async-dashboard-stats', [], 'get', {}, self.user, 200),
+            ('register', [], 'post', {'username': 'newcomer', 'password': 'snacks123',
+                                      'password_confirm': 'snacks123'}, None, 201),
+            ('login', [], 'post', {'username': 'regular', 'password': 'snacks123'}, None, 200),
+            ('profile', [], 'get', {}, self.user, 200),
+            ('profile', [], 'patch', {'city': 'Lagos'}, self.user, 200),
+            ('dashboard-stats', [], 'get', {}, self.user, 200),
+            ('cart-list', [], 'get', {'expand': 'product'}, self.user, 200),
+            ('cart-summary', [], 'get', {}, self.user, 200),
+            ('cart-add', [], 'post', {'product_id': fresh.pk, 'quantity': 1}, self.user, 201),
+            ('cart-update', [cart_item.pk], 'patch', {'quantity': 3}, self.user, 200),
+            ('cart-bulk', [], 'post', {'items': [{'product_id': p.pk, 'quantity': 1} for p in self.products[5:9]]},
+             self.user, 200),
+            ('cart-delete', [cart_item.pk], 'delete', {}, self.user, 204),
+            ('wishlist-list', [], 'get', {}, self.user, 200),
+            ('wishlist-add', [], 'post', {'product_id': fresh.pk}, self.user, 201),
+            ('wishlist-delete', [wishlist_item.pk], 'delete', {}, self.user, 204),
+            ('order-list', [], 'get', {'expand': 'product'}, self.user, 200),
+            ('order-list', [], 'get', {'summary': 1}, self.user, 200),
+            ('order-detail', [self.order.pk], 'get', {}, self.user, 200),
+            ('review-create', [], 'post', {'product_id': fresh.pk, 'rating': 5}, self.user, 201),
+            ('order-reorder', [self.order.pk], 'post', {}, self.user, 200),
+            ('checkout-reserve', [], 'post', {}, self.user, 200),
+            ('order-create', [], 'post', {'shipping_address': 'Block A'}, self.user, 201),
+            ('checkout-reserve', [], 'delete', {}, self.user, 204),
+            ('cart-add', [], 'post', {'product_id': fresh.pk, 'quantity': 1}, self.user, 201),
+            ('cart-clear', [], 'delete', {}, self.user, 200),
+            ('cache-stats', [], 'get', {}, self.admin, 200),
+            ('metrics', [], 'get', {}, self.admin, 200),
+            ('token-rotate', [], 'post', {}, self.user, 200),
+            ('logout', [], 'post', {}, self.user, 200),
+        ]
+
+    def test_every_route_stays_within_budget(self):
+        for name, args, method, data, user, expected in self.routes():
+            with self.subTest(route=name, method=method, data=data):
+                cache.clear()
+                local_tokens.clear()
+                client = self.client_for(user)
+                response = getattr(client, method)(reverse(name, args=args), data, format='json' if method != 'get' else None)
+                self.assertEqual(response.status_code, expected, getattr(response, 'data', None))
+
+    def test_every_route_is_budgeted_and_covered(self):
+        covered = {name for name, *_ in self.routes()}
+        for pattern in urls.urlpatterns:
+            with self.subTest(route=pattern.name):
+                self.assertIsNotNone(budget_for(pattern.callback))
+                self.assertIn(pattern.name, covered)
+
+    def test_exceeding_the_budget_raises_with_sql_and_stack(self):
+        with mock.patch.object(views.ProductListView, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded) as ctx:
+                APIClient().get(reverse('product-list'))
+        message = str(ctx.exception)
+        self.assertIn('GET /api/products/ (product-list) ran', message)
+        self.assertIn('SELECT', message)
+        self.assertIn('Query 1 was run from:', message)
+
+    def test_stacks_are_only_taken_over_budget(self):
+        with mock.patch('ecomerce.budgets.traceback.extract_stack') as extract_stack:
+            self.assertEqual(APIClient().get(reverse('product-list')).status_code, 200)
+        extract_stack.assert_not_called()
+
+    @override_settings(QUERY_BUDGET_MODE='log')
+    def test_log_mode_reports_without_failing(self):
+        with mock.patch.object(views.ProductListView, 'query_budget', 0), \
+                self.assertLogs('ecomerce.budgets', 'ERROR') as logs:
+            response = APIClient().get(reverse('product-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('(product-list) ran', logs.output[0])
+
+    async def test_async_views_are_checked(self):
+        with mock.patch.object(async_views.category_list, 'query_budget', 0):
+            with self.assertRaises(QueryBudgetExceeded):
+                await AsyncClient().get(reverse('async-category-list'))
+
+
+class BenchmarkApiTests(BaseTestCase):
+    def test_benchmark_covers_every_route_and_leaves_no_data(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / 'results.json'
+            call_command('benchmark_api', iterations=2, output=str(output), stdout=StringIO())
+            results = json.loads(output.read_text())
+
+        routes = {key.split()[1].split('?')[0] for key in results['routes']}
+        self.assertEqual(routes, {pattern.name for pattern in urls.urlpatterns})
+        self.assertEqual(results['routes']['GET product-list']['requests'], 2)
+        self.assertFalse(User.objects.filter(username__startswith='apibench').exists())
+
+
+class PopulateDbTests(BaseTestCase):
+    def populate(self, **options):
+        call_command('populate_db', stdout=StringIO(), chunk_size=40, **options)
+
+    def test_generates_requested_rows_with_signal_side_effects(self):
+        self.populate(users=30, products=50, orders=60, reviews=100)
+
+        self.assertEqual(User.objects.filter(username__startswith='shopper').count(), 30)
+        self.assertEqual(Profile.objects.filter(user__username__startswith='shopper').count(), 30)
+        self.assertEqual(Order.objects.count(), 60)
+        self.assertEqual(Review.objects.count(), 100)
+        self.assertTrue(self.client.login(username=User.objects.filter(username__startswith='shopper').first().username,
+                                          password='snacks123'))
+        # Ratings and the search index are rebuilt after the raw inserts
+        product = Product.objects.filter(reviews__isnull=False).first()
+        self.assertEqual(product.rating_count, product.reviews.count())
+        self.assertEqual(product.rating_sum, sum(product.reviews.values_list('rating', flat=True)))
+        order = Order.objects.first()
+        self.assertEqual(order.total_amount, sum(item.total_price for item in order.items.all()))
+        searched = APIClient().get(reverse('product-list'), {'search': 'popcorn'}).data['results']
+        self.assertTrue(searched)
+        # New rows after the explicit primary keys still get fresh ones
+        self.assertGreater(Review.objects.create(user=self.make_user(), product=product, rating=3).pk,
+                           Review.objects.order_by('-pk')[1].pk)
+
+    def make_user(self):
+        return User.objects.create_user(username='late-reviewer')
+
+    def test_same_seed_same_rows(self):
+        def snapshot():
+            return (list(Product.objects.order_by('pk').values_list('name', 'price', 'stock', 'is_active')),
+                    list(Review.objects.order_by('pk').values_list('rating', 'comment')))
+
+        self.populate(products=20, users=5, reviews=40, seed=7)
+        first = snapshot()
+        Review.objects.all().delete()
+        Product.objects.all().delete()
+        self.populate(products=20, users=5, reviews=40, seed=7)
+        self.assertEqual(snapshot(), first)
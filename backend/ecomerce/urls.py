@@ -1,11 +1,12 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Authentication URLs
     path('auth/login/', views.CustomAuthToken.as_view(), name='login'),
     path('auth/register/', views.UserRegistrationView.as_view(), name='register'),
     path('auth/logout/', views.logout_view, name='logout'),
+    path('auth/token/rotate/', views.rotate_token, name='token-rotate'),
     
     # Profile URLs
     path('profile/', views.ProfileView.as_view(), name='profile'),
@@ -20,7 +21,9 @@ urlpatterns = [
     
     # Cart URLs
     path('cart/', views.CartListView.as_view(), name='cart-list'),
+    path('cart/summary/', views.cart_summary, name='cart-summary'),
     path('cart/add/', views.CartCreateView.as_view(), name='cart-add'),
+    path('cart/bulk/', views.bulk_update_cart, name='cart-bulk'),
     path('cart/<int:pk>/update/', views.CartUpdateView.as_view(), name='cart-update'),
     path('cart/<int:pk>/delete/', views.CartDeleteView.as_view(), name='cart-delete'),
     path('cart/clear/', views.clear_cart, name='cart-clear'),
@@ -29,6 +32,8 @@ urlpatterns = [
     path('orders/', views.OrderListView.as_view(), name='order-list'),
     path('orders/<int:pk>/', views.OrderDetailView.as_view(), name='order-detail'),
     path('orders/create/', views.create_order, name='order-create'),
+    path('checkout/reserve/', views.reserve_stock, name='checkout-reserve'),
+    path('orders/<int:pk>/reorder/', views.reorder, name='order-reorder'),
     
     # Review URLs
     path('products/<int:product_id>/reviews/', views.ReviewListView.as_view(), name='review-list'),
@@ -41,4 +46,12 @@ urlpatterns = [
     
     # Dashboard
     path('dashboard/stats/', views.dashboard_stats, name='dashboard-stats'),
+    path('cache/stats/', views.catalog_cache_stats, name='cache-stats'),
+    path('metrics/', views.metrics, name='metrics'),
+    
+    # Async versions of the read-heavy endpoints, for ASGI deployments
+    path('async/categories/', async_views.category_list, name='async-category-list'),
+    path('async/products/', async_views.product_list, name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/dashboard/stats/', async_views.dashboard_stats, name='async-dashboard-stats'),
 ]
@@ -1,23 +1,43 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from django.shortcuts import render
 from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Prefetch, Q, Sum, When, prefetch_related_objects
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, Wishlist
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from .budgets import query_budget
+from .cache import CachedResponseMixin, cache_stats, invalidate_catalog
+from .conditional import ConditionalGetMixin
+from .idempotency import idempotent
+from .metrics import render_metrics
+from .pagination import KeysetPagination
+from .replicas import ReplicaReadMixin
+from .search import search_products
+from .stats import catalog_counts, user_counts
+from .models import Product, Category, Cart, Order, OrderItem, Review, Profile, StockReservation, Wishlist
 from .serializers import (
-    ProductSerializer, CategorySerializer, CartItemSerializer, OrderSerializer,
-    ReviewSerializer, ProfileSerializer, UserSerializer, UserRegistrationSerializer,
-    WishlistSerializer
+    product_related, ProductSerializer, CategorySerializer, CartItemSerializer, CartBulkSerializer,
+    OrderSerializer, OrderSummarySerializer, ReviewSerializer, ProfileSerializer, UserSerializer,
+    UserRegistrationSerializer, WishlistSerializer
 )
 
 
 # Authentication Views
 class CustomAuthToken(ObtainAuthToken):
+    query_budget = 2
+
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data,
                                            context={'request': request})
@@ -36,6 +56,7 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 7
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -54,6 +75,7 @@ class UserRegistrationView(generics.CreateAPIView):
         }, status=status.HTTP_201_CREATED)
 
 
+@query_budget(2)
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def logout_view(request):
@@ -64,10 +86,22 @@ def logout_view(request):
         return Response({'error': 'Error logging out'}, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(6)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def rotate_token(request):
+    """Replace the caller's token; the old one stops working at once"""
+    with transaction.atomic():
+        Token.objects.filter(user=request.user).delete()
+        token = Token.objects.create(user=request.user)
+    return Response({'token': token.key})
+
+
 # Profile Views
 class ProfileView(generics.RetrieveUpdateAPIView):
     serializer_class = ProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get_object(self):
         profile, created = Profile.objects.get_or_create(user=self.request.user)
@@ -75,78 +109,176 @@ class ProfileView(generics.RetrieveUpdateAPIView):
 
 
 # Category Views
-class CategoryListView(generics.ListAPIView):
+class CategoryListView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
+    cache_dependencies = ('category',)
 
 
-class CategoryDetailView(generics.RetrieveAPIView):
+class CategoryDetailView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 1
+    cache_dependencies = ('category',)
 
 
 # Product Views
-class ProductListView(generics.ListAPIView):
+class ProductListView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
+    pagination_class = KeysetPagination
+    cache_dependencies = ('product', 'category')
+    etag_fields = ('updated_at', 'category__updated_at')
 
     def get_queryset(self):
-        queryset = Product.objects.filter(is_active=True)
+        queryset = Product.objects.filter(is_active=True).select_related('category')
         category = self.request.query_params.get('category', None)
         search = self.request.query_params.get('search', None)
         
         if category is not None:
             queryset = queryset.filter(category_id=category)
         
+        queryset = queryset.order_by('-created_at', '-id')
+        
         if search is not None:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
+            # Ranked full-text match; best matches first
+            queryset = search_products(queryset, search)
         
-        return queryset.order_by('-created_at')
+        return queryset
 
+    def paginate_queryset(self, queryset):
+        # Keyset pages are ordered by (created_at, id), which would silently
+        # drop the search ranking
+        if 'search' in self.request.query_params and self.paginator.cursor_requested(self.request):
+            raise ValidationError({'pagination': ['Cursor pagination is not available with search; use page numbers.']})
+        return super().paginate_queryset(queryset)
 
-class ProductDetailView(generics.RetrieveAPIView):
-    queryset = Product.objects.filter(is_active=True)
+
+class ProductDetailView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.RetrieveAPIView):
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 1
+    cache_dependencies = ('product', 'category')
+    etag_fields = ('updated_at', 'category__updated_at')
 
 
 # Cart Views
-class CartListView(generics.ListAPIView):
+class CartListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+    etag_fields = ('updated_at', 'product__updated_at', 'product__category__updated_at')
 
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related(product_related(self.request)).order_by('id')
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def cart_summary(request):
+    """Cart lines with subtotal, item count and stock warnings from one query"""
+    cart_items = list(
+        Cart.objects.filter(user=request.user).with_totals().order_by('id')
+    )
+    subtotal = cart_items[0].cart_subtotal if cart_items else 0
+    
+    return Response({
+        'items': CartItemSerializer(cart_items, many=True, context={'request': request}).data,
+        'subtotal': str(Decimal(subtotal).quantize(Decimal('0.01'))),
+        'item_count': cart_items[0].cart_item_count if cart_items else 0,
+        'line_count': len(cart_items),
+        'stock_warnings': [
+            {
+                'cart_item_id': item.id,
+                'product_id': item.product_id,
+                'requested': item.quantity,
+                'available': item.quantity - item.stock_shortfall,
+                'shortfall': item.stock_shortfall,
+            }
+            for item in cart_items if item.stock_shortfall
+        ],
+    })
 
 
 class CartCreateView(generics.CreateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 11
+
+    @method_decorator(idempotent)
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         product_id = serializer.validated_data['product_id']
         quantity = serializer.validated_data['quantity']
         
-        # Check if item already exists in cart
-        cart_item, created = Cart.objects.get_or_create(
-            user=self.request.user,
-            product_id=product_id,
-            defaults={'quantity': quantity}
-        )
+        # Bump the existing line in place, or create it; a concurrent request
+        # that creates it first makes get_or_create return it, so add again.
+        # Either update refuses to go past the stock left for this user
+        if not Cart.objects.add_quantity(self.request.user, product_id, quantity):
+            cart_item, created = Cart.objects.get_or_create(
+                user=self.request.user,
+                product_id=product_id,
+                defaults={'quantity': quantity}
+            )
+            if not created and not Cart.objects.add_quantity(self.request.user, product_id, quantity):
+                raise ValidationError({'quantity': ["Not enough items in stock"]})
+
+
+@query_budget(11)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def bulk_update_cart(request):
+    """Apply many add/set/remove operations to the cart in one transaction"""
+    serializer = CartBulkSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    operations = serializer.validated_data['items']
+    products = serializer.products
+    
+    with transaction.atomic():
+        existing = Cart.objects.select_for_update().filter(
+            user=request.user, product_id__in=products
+        ).values_list('product_id', 'quantity')
+        quantities = dict(existing)
         
-        if not created:
-            # Update quantity if item already exists
-            cart_item.quantity += quantity
-            cart_item.save()
+        # Operations apply in order, so repeated products accumulate
+        for operation in operations:
+            product_id = operation['product_id']
+            if operation['action'] == 'remove':
+                quantities[product_id] = 0
+            elif operation['action'] == 'set':
+                quantities[product_id] = operation['quantity']
+            else:
+                quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+        
+        held = StockReservation.objects.held_quantities(products, exclude_user=request.user)
+        errors = {}
+        for index, operation in enumerate(operations):
+            product = products[operation['product_id']]
+            available = product.available_stock(held.get(product.id, 0))
+            if quantities[product.id] > available:
+                errors[index] = [f"Only {available} items in stock"]
+        if errors:
+            return Response({'items': errors}, status=status.HTTP_400_BAD_REQUEST)
+        
+        Cart.objects.set_quantities(request.user, quantities)
+    
+    cart_items = Cart.objects.filter(user=request.user).select_related('product').order_by('id')
+    return Response(CartItemSerializer(cart_items, many=True, context={'request': request}).data)
 
 
 class CartUpdateView(generics.UpdateAPIView):
     serializer_class = CartItemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get_queryset(self):
         return Cart.objects.filter(user=self.request.user)
@@ -154,11 +286,13 @@ class CartUpdateView(generics.UpdateAPIView):
 
 class CartDeleteView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         return Cart.objects.filter(user=self.request.user)
 
 
+@query_budget(2)
 @api_view(['DELETE'])
 @permission_classes([permissions.IsAuthenticated])
 def clear_cart(request):
@@ -167,109 +301,298 @@ def clear_cart(request):
 
 
 # Order Views
-class OrderListView(generics.ListAPIView):
+class OrderQuerysetMixin:
+    """Order history with everything the serializer touches loaded up front.
+
+    Full orders come with the user joined and the items, their products and
+    (with ?expand=product) categories prefetched, so a page costs the same
+    number of queries however many orders and items it holds. ``?summary=1``
+    skips the items and returns per-order totals computed in SQL instead.
+    """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    etag_fields = ('updated_at', 'items__product__updated_at', 'items__product__category__updated_at')
+
+    def summary_requested(self):
+        return self.request.query_params.get('summary') in ('1', 'true')
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).order_by('-created_at')
+        orders = Order.objects.filter(user=self.request.user)
+        if self.summary_requested():
+            return orders.with_item_summary()
+        items = OrderItem.objects.select_related(product_related(self.request)).order_by('id')
+        return orders.select_related('user').prefetch_related(Prefetch('items', queryset=items))
 
+    def get_serializer_class(self):
+        if self.summary_requested():
+            return OrderSummarySerializer
+        return super().get_serializer_class()
 
-class OrderDetailView(generics.RetrieveAPIView):
-    serializer_class = OrderSerializer
-    permission_classes = [permissions.IsAuthenticated]
+
+class OrderListView(OrderQuerysetMixin, ConditionalGetMixin, generics.ListAPIView):
+    pagination_class = KeysetPagination
+    query_budget = 4
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return super().get_queryset().order_by('-created_at', '-id')
 
 
-@api_view(['POST'])
+class OrderDetailView(OrderQuerysetMixin, ConditionalGetMixin, generics.RetrieveAPIView):
+    query_budget = 3
+
+
+@query_budget(8)
+@api_view(['POST', 'DELETE'])
 @permission_classes([permissions.IsAuthenticated])
-def create_order(request):
-    cart_items = Cart.objects.filter(user=request.user)
-    
-    if not cart_items.exists():
-        return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Calculate total amount
-    total_amount = sum(item.total_price for item in cart_items)
+def reserve_stock(request):
+    """Hold the cart's stock while the user checks out, or release the hold"""
+    if request.method == 'DELETE':
+        StockReservation.objects.filter(user=request.user).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
     
-    # Get shipping address
-    shipping_address = request.data.get('shipping_address', '')
-    if not shipping_address:
-        # Use user's profile address if no shipping address provided
-        try:
-            profile = Profile.objects.get(user=request.user)
-            shipping_address = f"{profile.address}, {profile.city}, {profile.country}"
-        except Profile.DoesNotExist:
-            return Response({'error': 'Shipping address required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Create order
-    order = Order.objects.create(
-        user=request.user,
-        total_amount=total_amount,
-        shipping_address=shipping_address
-    )
+    ttl = getattr(settings, 'STOCK_RESERVATION_TTL', 60 * 10)
+    with transaction.atomic():
+        # Lock the cart lines first, as create_order does, so the holds
+        # match the cart a concurrent checkout sees
+        cart_items = list(Cart.objects.select_for_update().filter(user=request.user).order_by('product_id'))
+        if not cart_items:
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Lock in the same order as create_order; the lock is only held for
+        # this short transaction, the reservation rows do the holding
+        products = Product.objects.select_for_update().filter(
+            pk__in=[item.product_id for item in cart_items]
+        ).order_by('pk').in_bulk()
+        held = StockReservation.objects.held_quantities(products, exclude_user=request.user)
+        
+        shortages = []
+        for cart_item in cart_items:
+            available = products[cart_item.product_id].available_stock(held.get(cart_item.product_id, 0))
+            if cart_item.quantity > available:
+                shortages.append({
+                    'product_id': cart_item.product_id,
+                    'requested': cart_item.quantity,
+                    'available': available,
+                })
+        if shortages:
+            return Response({'error': 'Some items are no longer available', 'items': shortages},
+                            status=status.HTTP_409_CONFLICT)
+        
+        # Replace the user's holds with the current cart, all on a new expiry
+        expires_at = timezone.now() + timedelta(seconds=ttl)
+        StockReservation.objects.filter(user=request.user).exclude(product_id__in=products).delete()
+        StockReservation.objects.bulk_create(
+            [
+                StockReservation(user=request.user, product_id=item.product_id,
+                                 quantity=item.quantity, expires_at=expires_at)
+                for item in cart_items
+            ],
+            update_conflicts=True,
+            unique_fields=['user', 'product'],
+            update_fields=['quantity', 'expires_at'],
+        )
     
-    # Create order items and update product stock
-    for cart_item in cart_items:
-        product = cart_item.product
+    return Response({
+        'expires_at': expires_at,
+        'items': [{'product_id': item.product_id, 'quantity': item.quantity} for item in cart_items],
+    })
+
+
+@query_budget(15)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def create_order(request):
+    with transaction.atomic():
+        # Lock the user's cart lines before anything else: a concurrent
+        # checkout by the same user waits here, then finds the cart already
+        # emptied by this one and stops at the check below
+        cart_items = list(
+            Cart.objects.select_for_update().filter(user=request.user).order_by('product_id')
+        )
         
-        # Check stock availability
-        if cart_item.quantity > product.stock:
-            order.delete()  # Delete the order if stock is insufficient
-            return Response({
-                'error': f'Insufficient stock for {product.name}. Only {product.stock} available.'
-            }, status=status.HTTP_400_BAD_REQUEST)
+        if not cart_items:
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create order item
-        OrderItem.objects.create(
-            order=order,
-            product=product,
-            quantity=cart_item.quantity,
-            price=product.price
+        # Get shipping address
+        shipping_address = request.data.get('shipping_address', '')
+        if not shipping_address:
+            # Use user's profile address if no shipping address provided
+            try:
+                profile = Profile.objects.get(user=request.user)
+                shipping_address = f"{profile.address}, {profile.city}, {profile.country}"
+            except Profile.DoesNotExist:
+                return Response({'error': 'Shipping address required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Lock the products in primary key order so concurrent checkouts
+        # sharing products always acquire their locks in the same order
+        products = Product.objects.select_for_update().filter(
+            pk__in=[item.product_id for item in cart_items]
+        ).order_by('pk').in_bulk()
+        
+        # Check stock availability before writing anything; units other users
+        # have reserved for their own checkout are not available
+        held = StockReservation.objects.held_quantities(products, exclude_user=request.user)
+        for cart_item in cart_items:
+            product = products[cart_item.product_id]
+            available = product.available_stock(held.get(product.pk, 0))
+            if cart_item.quantity > available:
+                return Response({
+                    'error': f'Insufficient stock for {product.name}. Only {available} available.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Decrement every product's stock in one conditional UPDATE; a row
+        # whose stock dropped below the requested quantity is left untouched
+        enough_stock = Q()
+        new_stock = []
+        for cart_item in cart_items:
+            enough_stock |= Q(pk=cart_item.product_id, stock__gte=cart_item.quantity)
+            new_stock.append(When(pk=cart_item.product_id, then=F('stock') - cart_item.quantity))
+        updated = Product.objects.filter(enough_stock).update(
+            stock=Case(*new_stock, default=F('stock'), output_field=PositiveIntegerField()),
+            updated_at=timezone.now(),
+        )
+        if updated != len(cart_items):
+            transaction.set_rollback(True)
+            return Response({'error': 'Stock changed during checkout, please try again'},
+                            status=status.HTTP_409_CONFLICT)
+        
+        # Create order and its items
+        total_amount = sum(
+            products[item.product_id].price * item.quantity for item in cart_items
         )
+        order = Order.objects.create(
+            user=request.user,
+            total_amount=total_amount,
+            shipping_address=shipping_address
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=products[cart_item.product_id],
+                quantity=cart_item.quantity,
+                price=products[cart_item.product_id].price
+            )
+            for cart_item in cart_items
+        ])
+        
+        # Clear the cart lines that were ordered and release their holds
+        Cart.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+        StockReservation.objects.filter(user=request.user, product_id__in=products).delete()
         
-        # Update product stock
-        product.stock -= cart_item.quantity
-        product.save()
+        # Stock moved through a queryset update, which sends no signals
+        transaction.on_commit(lambda: invalidate_catalog('product'))
     
-    # Clear cart
-    cart_items.delete()
+    # Load the new items with their products in one query for the response
+    items = OrderItem.objects.select_related(product_related(request)).order_by('id')
+    prefetch_related_objects([order], Prefetch('items', queryset=items))
+    return Response(OrderSerializer(order, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
+@query_budget(11)
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@idempotent
+def reorder(request, pk):
+    """Copy a previous order's items into the cart, clamped to current stock"""
+    order = get_object_or_404(Order.objects.only('id'), pk=pk, user=request.user)
+    
+    with transaction.atomic():
+        # Lock the cart lines this merges into before reading them, as
+        # bulk_update_cart does, so a concurrent add waits instead of being
+        # overwritten by the absolute quantities written below
+        in_cart = dict(
+            Cart.objects.select_for_update()
+            .filter(user=request.user, product_id__in=OrderItem.objects.filter(order=order).values('product_id'))
+            .values_list('product_id', 'quantity')
+        )
+        # Each ordered product with its current stock, read in a single query
+        lines = list(
+            OrderItem.objects.filter(order=order)
+            .values('product_id')
+            .annotate(
+                ordered=Sum('quantity'),
+                stock=F('product__stock'),
+                is_active=F('product__is_active'),
+            )
+            .order_by('product_id')
+        )
+        for line in lines:
+            line['in_cart'] = in_cart.get(line['product_id'], 0)
+        
+        held = StockReservation.objects.held_quantities(
+            [line['product_id'] for line in lines], exclude_user=request.user
+        )
+        
+        quantities = {}
+        adjustments = []
+        for line in lines:
+            if line['is_active']:
+                available = max(line['stock'] - held.get(line['product_id'], 0), 0)
+            else:
+                available = 0
+            wanted = line['in_cart'] + line['ordered']
+            quantity = min(wanted, available)
+            if quantity > line['in_cart']:
+                quantities[line['product_id']] = quantity
+            if quantity < wanted:
+                adjustments.append({
+                    'product_id': line['product_id'],
+                    'requested': line['ordered'],
+                    'added': max(quantity - line['in_cart'], 0),
+                    'reason': 'out_of_stock' if not available else 'limited_stock',
+                })
+        
+        Cart.objects.set_quantities(request.user, quantities)
     
-    return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+    cart_items = Cart.objects.filter(user=request.user).select_related('product').order_by('id')
+    return Response({
+        'items': CartItemSerializer(cart_items, many=True, context={'request': request}).data,
+        'adjustments': adjustments,
+    })
 
 
 # Review Views
-class ReviewListView(generics.ListAPIView):
+class ReviewListView(ReplicaReadMixin, CachedResponseMixin, ConditionalGetMixin, generics.ListAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
+    pagination_class = KeysetPagination
+    cache_dependencies = ('review', 'product', 'category')
+    etag_fields = ('updated_at', 'product__updated_at', 'product__category__updated_at')
 
     def get_queryset(self):
         product_id = self.kwargs.get('product_id')
-        return Review.objects.filter(product_id=product_id).order_by('-created_at')
+        return Review.objects.filter(product_id=product_id).select_related('user', product_related(self.request)).order_by('-created_at', '-id')
 
 
 class ReviewCreateView(generics.CreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 6
 
+    @transaction.atomic
     def perform_create(self, serializer):
+        # The product's rating aggregates are bumped by a post_save signal,
+        # so the review and the new totals commit together
         serializer.save(user=self.request.user)
 
 
 # Wishlist Views
-class WishlistListView(generics.ListAPIView):
+class WishlistListView(ConditionalGetMixin, generics.ListAPIView):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+    etag_fields = ('created_at', 'product__updated_at', 'product__category__updated_at')
 
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        return Wishlist.objects.filter(user=self.request.user).select_related(product_related(self.request)).order_by('id')
 
 
 class WishlistCreateView(generics.CreateAPIView):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
@@ -277,28 +600,38 @@ class WishlistCreateView(generics.CreateAPIView):
 
 class WishlistDeleteView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         return Wishlist.objects.filter(user=self.request.user)
 
 
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
 def dashboard_stats(request):
     """Get basic stats for dashboard"""
-    total_products = Product.objects.filter(is_active=True).count()
-    total_categories = Category.objects.count()
-    
-    stats = {
-        'total_products': total_products,
-        'total_categories': total_categories,
-    }
+    # Site-wide counts come from a short-lived snapshot, the user's own
+    # counts from a single query
+    stats = dict(catalog_counts())
     
     if request.user.is_authenticated:
-        stats.update({
-            'cart_items': Cart.objects.filter(user=request.user).count(),
-            'wishlist_items': Wishlist.objects.filter(user=request.user).count(),
-            'total_orders': Order.objects.filter(user=request.user).count(),
-        })
+        stats.update(user_counts(request.user))
     
     return Response(stats)
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def catalog_cache_stats(request):
+    """Response cache hits and misses per catalog view in this process"""
+    return Response(cache_stats())
+
+
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics(request):
+    """Per-view request metrics in the Prometheus text format"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')